@@ -0,0 +1,340 @@
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 获取当前目录
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 在子进程中执行：记录主窗口显示时间、显示时是否已导入pandas/openpyxl、后台加载完成时间
+STARTUP_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+import main
+app = QApplication(sys.argv)
+window = main.ExcelMergerApp()
+window.show()
+heavy_loaded = [name for name in ("pandas", "openpyxl") if name in sys.modules]
+app.processEvents()
+shown = time.perf_counter() - start
+window.prewarm_worker.wait()
+app.processEvents()
+ready = time.perf_counter() - start
+print(json.dumps({"shown": shown, "ready": ready, "heavy_loaded": heavy_loaded,
+                  "processor_ready": window.processor is not None}))
+'''
+
+
+def measure_startup(runs):
+    """多次冷启动程序，统计主窗口显示和组件加载完成的耗时"""
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    results = []
+    for _ in range(runs):
+        process_start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=current_dir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process"] = time.perf_counter() - process_start
+        results.append(result)
+
+    print(f"启动测试（{runs}次，取中位数）：")
+    print(f"  主窗口显示：{statistics.median(r['shown'] for r in results):.3f} 秒")
+    print(f"  组件加载完成：{statistics.median(r['ready'] for r in results):.3f} 秒")
+    print(f"  进程总耗时：{statistics.median(r['process'] for r in results):.3f} 秒")
+    heavy_loaded = sorted({name for r in results for name in r["heavy_loaded"]})
+    print(f"  主窗口显示时已导入：{', '.join(heavy_loaded) if heavy_loaded else '无'}")
+    return results
+
+
+# 规模测试：各阶段在不同行数、文件数下的耗时，拟合耗时随规模增长的幂次（耗时 ≈ c × 规模^幂次）
+DEFAULT_ROWS = [1000, 10000, 100000]
+DEFAULT_FILES = [1, 10, 100]
+DEFAULT_FILE_ROWS = 100  # 文件数测试中每个文件的行数
+HISTORY_FILE = os.path.join(current_dir, "benchmark_history.json")
+
+# 各阶段允许的最大幂次：均应为线性（或n·log n），出现逐行两两比较等平方级写法时幂次接近2
+MAX_EXPONENT = 1.3
+EXPONENT_TOLERANCE = 0.2  # 与上次记录相比幂次增加超过该值视为退化
+MIN_FIT_SECONDS = 0.05    # 最大规模耗时低于该值时计时误差较大，不判断幂次
+
+# 耗时上限：行数测试为每千行秒数，文件数测试为每个文件秒数
+TIME_BUDGETS = {
+    "merge_files/rows": 2.0,
+    "check_duplicates/rows": 0.05,
+    "save_output/rows": 2.0,
+    "check_file/rows": 1.5,
+    "merge_files/files": 0.5,
+}
+
+WORK_TYPES = ["装表接电", "计量装置轮换", "用电检查", "采集运维", "业扩勘察", "电能表现场校验"]
+STATIONS = ["城关供电所", "东区供电所", "西区供电所", "南区供电所", "北区供电所"]
+UNITS = ["计量用户运维一班", "计量用户运维二班", "外包公司", "用电检查班"]
+SPECIALTIES = ["计量", "用电检查", "业扩", "采集"]
+RISKS = [("低风险", "是"), ("可接受", "否")]
+
+
+def generate_source(path, rows, seed=0):
+    """生成与实际作业计划格式相同的源文件：第5行为表头，之后为数据行，时间混用日期和几种文本格式"""
+    from openpyxl import Workbook
+    from excel_processor import ExcelProcessor
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(["附录2"])
+    ws.append([])
+    ws.append(["供电服务中心营销现场作业计划审批表"])
+    ws.append([])
+    ws.append(ExcelProcessor.REQUIRED_COLUMNS)
+
+    base = datetime(2025, 4, 1)
+    for index in range(rows):
+        start = base + timedelta(days=rng.randrange(60))
+        end = start + timedelta(days=rng.randrange(3))
+        station = rng.choice(STATIONS)
+        location = f"{station[:2]}{rng.randrange(max(rows // 2, 10))}号"
+        unit = rng.choice(UNITS)
+        # 计量班组的作业类型和项目管理单位包含施工地点，供规范检查使用
+        work_type = f"{rng.choice(WORK_TYPES)}{location}" if "计量" in unit else rng.choice(WORK_TYPES)
+        department = f"营销部{location}" if "计量" in unit else "营销部"
+        risk, approval = rng.choice(RISKS)
+        if rng.random() < 0.2:
+            start, end = start.strftime("%Y/%m/%d"), end.strftime("%Y-%m-%d 08:00")
+        ws.append([index + 1, work_type, department, station, unit, location, start, end,
+                   f"负责人{rng.randrange(max(rows // 20, 5))}", rng.choice(SPECIALTIES), risk, approval,
+                   rng.randrange(2, 8), approval, ""])
+    wb.save(path)
+
+
+def timed(function, repeat):
+    """执行repeat次，返回最短耗时（秒）和最后一次的返回值"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def fit_exponent(sizes, seconds):
+    """对数坐标下最小二乘拟合耗时随规模增长的幂次"""
+    points = [(math.log(size), math.log(max(value, 1e-6))) for size, value in zip(sizes, seconds)]
+    if len(points) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if denominator == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator
+
+
+def measure_rows(work_dir, template_path, sizes, repeat):
+    """单个文件、不同行数下各阶段的耗时，返回{阶段: [秒数]}"""
+    from PySide6.QtWidgets import QApplication
+    from excel_processor import ExcelProcessor
+    from file_preview import FilePreviewWindow
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = FilePreviewWindow()
+    timings = {"merge_files/rows": [], "check_duplicates/rows": [], "save_output/rows": [], "check_file/rows": []}
+
+    # 先以少量数据运行一遍，避免首次调用时的导入和模板解析计入最小规模的耗时
+    warmup = os.path.join(work_dir, "warmup.xlsx")
+    generate_source(warmup, 20)
+    processor = ExcelProcessor()
+    merged_data, _ = processor.merge_files([warmup])
+    processor.save_output(template_path, merged_data, warmup)
+    window.current_file = warmup
+    window.check_file()
+
+    for rows in sizes:
+        print(f"  {rows} 行 ...", flush=True)
+        source = os.path.join(work_dir, f"rows_{rows}.xlsx")
+        generate_source(source, rows)
+        output = os.path.join(work_dir, f"output_{rows}.xlsx")
+
+        processor = ExcelProcessor()
+        elapsed, (merged_data, message) = timed(lambda: processor.merge_files([source]), repeat)
+        if merged_data is None:
+            raise RuntimeError(f"合并失败：{message}")
+        timings["merge_files/rows"].append(elapsed)
+
+        elapsed, _ = timed(processor.check_duplicates, repeat)
+        timings["check_duplicates/rows"].append(elapsed)
+
+        elapsed, (success, message) = timed(lambda: processor.save_output(template_path, merged_data, output),
+                                            repeat)
+        if not success:
+            raise RuntimeError(message)
+        timings["save_output/rows"].append(elapsed)
+
+        # 规范检查会在原文件上标记并保存，每次检查副本
+        checked = os.path.join(work_dir, f"checked_{rows}.xlsx")
+
+        def check():
+            shutil.copyfile(output, checked)
+            window.current_file = checked
+            start = time.perf_counter()
+            window.check_file()
+            return time.perf_counter() - start
+
+        timings["check_file/rows"].append(min(check() for _ in range(repeat)))
+        app.processEvents()
+
+    window.close()
+    return timings
+
+
+def measure_files(work_dir, sizes, file_rows, repeat):
+    """不同文件数（每个文件file_rows行）下合并的耗时"""
+    from excel_processor import ExcelProcessor
+
+    sources = []
+    timings = {"merge_files/files": []}
+    for files in sizes:
+        print(f"  {files} 个文件 ...", flush=True)
+        while len(sources) < files:
+            source = os.path.join(work_dir, f"file_{len(sources)}.xlsx")
+            generate_source(source, file_rows, seed=len(sources))
+            sources.append(source)
+
+        processor = ExcelProcessor()
+        elapsed, (merged_data, message) = timed(lambda: processor.merge_files(sources[:files]), repeat)
+        if merged_data is None:
+            raise RuntimeError(f"合并失败：{message}")
+        timings["merge_files/files"].append(elapsed)
+    return timings
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def previous_result(history, stage, sizes):
+    """历史记录中同一阶段、同一组规模的最近一次结果"""
+    for record in reversed(history):
+        result = record["results"].get(stage)
+        if result and result["sizes"] == sizes and result.get("exponent") is not None:
+            return result
+    return None
+
+
+def check_results(results, history):
+    """检查幂次和耗时上限，返回不通过的说明列表"""
+    failures = []
+    for stage, result in results.items():
+        sizes, seconds, exponent = result["sizes"], result["seconds"], result["exponent"]
+        # 耗时上限按最大规模计算，小规模时固定开销占比较大
+        unit = "千行" if stage.endswith("/rows") else "个文件"
+        per_unit = seconds[-1] / (sizes[-1] / 1000 if stage.endswith("/rows") else sizes[-1])
+        budget = TIME_BUDGETS.get(stage)
+        if budget is not None and per_unit > budget:
+            failures.append(f"{stage}：每{unit}耗时 {per_unit:.3f} 秒，超过上限 {budget} 秒")
+
+        if exponent is None or max(seconds) < MIN_FIT_SECONDS:
+            continue
+        if exponent > MAX_EXPONENT:
+            failures.append(f"{stage}：耗时随规模增长的幂次为 {exponent:.2f}，超过上限 {MAX_EXPONENT}")
+        previous = previous_result(history, stage, sizes)
+        if previous is not None and exponent > previous["exponent"] + EXPONENT_TOLERANCE:
+            failures.append(f"{stage}：幂次由 {previous['exponent']:.2f} 增加到 {exponent:.2f}")
+    return failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=current_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def measure_scaling(rows_sizes, file_sizes, file_rows, repeat, history_path):
+    """运行规模测试并与历史记录比较，返回不通过的说明列表；history_path为None时不读写历史记录"""
+    template_path = os.path.join(current_dir, "输出模版.xlsx")
+    timings = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        if rows_sizes:
+            print("行数测试：")
+            timings.update(measure_rows(work_dir, template_path, rows_sizes, repeat))
+        if file_sizes:
+            print(f"文件数测试（每个文件 {file_rows} 行）：")
+            timings.update(measure_files(work_dir, file_sizes, file_rows, repeat))
+
+    results = {}
+    for stage, seconds in timings.items():
+        sizes = rows_sizes if stage.endswith("/rows") else file_sizes
+        results[stage] = {"sizes": sizes, "seconds": seconds, "exponent": fit_exponent(sizes, seconds)}
+
+    print("\n各阶段耗时（规模：秒数）及拟合的幂次：")
+    for stage, result in results.items():
+        cells = "  ".join(f"{size}：{value:.3f}" for size, value in zip(result["sizes"], result["seconds"]))
+        exponent = "—" if result["exponent"] is None else f"{result['exponent']:.2f}"
+        print(f"  {stage:<24}{cells}  幂次 {exponent}")
+
+    history = load_history(history_path) if history_path else []
+    failures = check_results(results, history)
+
+    if history_path:
+        history.append({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "results": results,
+            "failures": failures,
+        })
+        with open(history_path, "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已追加到 {history_path}")
+
+    if failures:
+        print("\n未通过：")
+        for failure in failures:
+            print(f"  {failure}")
+    else:
+        print("\n全部通过")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel合并工具性能测试")
+    parser.add_argument("--runs", type=int, default=5, help="启动测试的重复次数")
+    parser.add_argument("--scaling", action="store_true", help="运行规模测试（默认运行启动测试）")
+    parser.add_argument("--rows", type=int, nargs="*", default=DEFAULT_ROWS, help="行数测试的各个行数")
+    parser.add_argument("--files", type=int, nargs="*", default=DEFAULT_FILES, help="文件数测试的各个文件数")
+    parser.add_argument("--file-rows", type=int, default=DEFAULT_FILE_ROWS, help="文件数测试中每个文件的行数")
+    parser.add_argument("--repeat", type=int, default=1, help="规模测试中每项的重复次数（取最短耗时）")
+    parser.add_argument("--history", default=HISTORY_FILE, help="历史记录文件")
+    parser.add_argument("--no-history", action="store_true", help="不读写历史记录")
+    args = parser.parse_args()
+
+    if not args.scaling:
+        measure_startup(args.runs)
+        return
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    failures = measure_scaling(sorted(args.rows), sorted(args.files), args.file_rows, args.repeat,
+                               None if args.no_history else args.history)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
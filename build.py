@@ -1,5 +1,6 @@
 import PyInstaller.__main__
 import os
+import sys
 
 # 获取当前目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -11,7 +12,16 @@ main_script = os.path.join(current_dir, 'main.py')
 datas = [
     ('输出模版.xlsx', '.'),
     ('excel_processor.py', '.'),
-    ('file_preview.py', '.')
+    ('file_preview.py', '.'),
+    ('template_cache.py', '.'),
+    ('date_normalizer.py', '.'),
+    ('conflict_detector.py', '.'),
+    ('fuzzy_matcher.py', '.'),
+    ('snapshot.py', '.'),
+    ('streaming_merge.py', '.'),
+    ('diagnostics.py', '.'),
+    ('highlight.py', '.'),
+    ('merge_diff.py', '.')
 ]
 
 # 构建datas参数
@@ -19,6 +29,13 @@ datas_args = []
 for src, dst in datas:
     datas_args.extend(['--add-data', f'{src}{os.pathsep}{dst}'])
 
+# 默认打包为文件夹（onedir），启动时无需每次解压全部文件，启动更快；
+# 需要单个exe时使用 python build.py --onefile
+bundle_mode = '--onefile' if '--onefile' in sys.argv[1:] else '--onedir'
+
+# 程序未使用、但可能被pandas等依赖间接引入的模块，排除后可减小体积、加快启动
+excludes = ['tkinter', 'matplotlib', 'scipy', 'IPython', 'PyQt5', 'PyQt6']
+
 # PyInstaller参数
 options = [
     main_script,
@@ -26,11 +43,14 @@ options = [
     '--windowed',
     '--noconsole',
     '--clean',
-    '--onefile',
+    bundle_mode,
     '--hidden-import=pandas',
     '--hidden-import=openpyxl',
     '--hidden-import=PySide6',
-] + datas_args
+    # excel_processor等模块在main.py中延迟导入
+    '--hidden-import=excel_processor',
+    '--hidden-import=file_preview',
+] + [f'--exclude-module={module}' for module in excludes] + datas_args
 
 # 运行PyInstaller
 PyInstaller.__main__.run(options) 
\ No newline at end of file
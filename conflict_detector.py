@@ -0,0 +1,100 @@
+import pandas as pd
+
+# 冲突检查的分组列：同一施工地点、同一工作负责人的作业时间不应重叠
+LOCATION_COLUMN = "施工地点"
+PERSON_COLUMN = "工作负责人及电话（电话可选填）"
+CONFLICT_TYPES = {
+    LOCATION_COLUMN: "施工地点时间重叠",
+    PERSON_COLUMN: "工作负责人时间重叠",
+}
+
+
+def normalize_location(series):
+    """施工地点：去除空白，统一全角括号"""
+    text = series.astype(str).str.replace(r"\s+", "", regex=True)
+    return text.str.replace("（", "(", regex=False).str.replace("）", ")", regex=False)
+
+
+# 电话号码：7位以上的数字（可带区号、+86和短横线、空格分隔），较短的数字视为姓名的一部分（如"负责人1"）
+PHONE_PATTERN = r"(?:\+?86)?\d(?:[\d\s\-]*\d){6,}"
+
+
+def normalize_person(series):
+    """工作负责人：去掉电话号码、"电话"等字样和分隔符，只保留姓名"""
+    text = series.astype(str).str.replace(PHONE_PATTERN, "", regex=True)
+    text = text.str.replace(r"电话|手机|联系方式", "", regex=True)
+    return text.str.replace(r"[\s\-+()（）:：,，、/]+", "", regex=True)
+
+
+KEY_NORMALIZERS = {
+    LOCATION_COLUMN: normalize_location,
+    PERSON_COLUMN: normalize_person,
+}
+
+
+def find_overlaps(keys, starts, ends):
+    """按分组排序后扫描一遍，返回时间重叠的行对[(行1, 行2, 分组值)]
+
+    每行与同组中此前结束最晚的行比较，开始时间不晚于其结束时间即为重叠（按日期计，首尾相接也算重叠）。
+    这样每个存在重叠的行都会出现在结果中，但不会列出所有两两组合。
+    """
+    valid = keys.notna() & (keys != "") & starts.notna()
+    if not valid.any():
+        return []
+
+    # 分组值编码为整数，时间转换为整数，扫描时只比较整数
+    codes, uniques = pd.factorize(keys[valid])
+    frame = pd.DataFrame({
+        "code": codes,
+        "start": starts[valid].to_numpy("datetime64[ns]").view("int64"),
+        "end": ends[valid].to_numpy("datetime64[ns]").view("int64"),
+    }, index=keys.index[valid])
+
+    # 结束时间为空或早于开始时间时按开始时间处理（空值转换后为最小整数）
+    frame["end"] = frame["end"].where(frame["end"] >= frame["start"], frame["start"])
+    frame = frame.sort_values(["code", "start"], kind="mergesort")
+
+    pairs = []
+    current_code = None
+    holder, max_end = None, None
+    for row, code, start, end in zip(frame.index.tolist(), frame["code"].tolist(), frame["start"].tolist(),
+                                     frame["end"].tolist()):
+        if code != current_code:
+            current_code, holder, max_end = code, row, end
+            continue
+        if start <= max_end:
+            pairs.append((holder, row, uniques[code]))
+        if end > max_end:
+            holder, max_end = row, end
+    return pairs
+
+
+def detect_conflicts(merged_data, exclude_rows=()):
+    """检查同一施工地点或同一工作负责人作业时间重叠的行
+
+    exclude_rows中的行（如已标记的重复行）不参与检查。
+    返回(冲突列表, 冲突行索引列表)，冲突列表中每项为{'type', 'key', 'rows'}。
+    """
+    if merged_data is None or len(merged_data) == 0:
+        return [], []
+
+    data = merged_data.drop(index=list(exclude_rows), errors="ignore")
+    # 按日期比较：源文件中时间有的只填日期（即0点），有的带具体时刻，统一只保留日期
+    starts = pd.to_datetime(data["工作开始时间"], errors="coerce").dt.normalize()
+    ends = pd.to_datetime(data["工作结束时间"], errors="coerce").dt.normalize()
+
+    conflicts = []
+    conflict_rows = set()
+    for column, conflict_type in CONFLICT_TYPES.items():
+        if column not in data.columns:
+            continue
+        keys = KEY_NORMALIZERS[column](data[column]).where(data[column].notna())
+        for first, second, key in find_overlaps(keys, starts, ends):
+            conflicts.append({
+                "type": conflict_type,
+                "key": key,
+                "rows": (first, second),
+            })
+            conflict_rows.update((first, second))
+
+    return conflicts, sorted(conflict_rows)
@@ -0,0 +1,127 @@
+import pandas as pd
+
+# 常见的时间文本格式，按出现频率排列
+DATE_FORMATS = [
+    "%Y/%m/%d",
+    "%Y-%m-%d",
+    "%Y/%m/%d %H:%M",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y.%m.%d",
+    "%Y.%m.%d %H:%M",
+    "%Y%m%d",
+]
+
+# Excel日期序列号的合理范围（约1954年至2118年），超出范围的数字不按日期处理
+EXCEL_SERIAL_MIN = 20000
+EXCEL_SERIAL_MAX = 80000
+EXCEL_EPOCH = "1899-12-30"
+
+# 中文日期，如"2025年4月1日"、"4月1日"、"4月1日8时30分"、"4月1日 08:30"
+CHINESE_DATE_PATTERN = (
+    r"^(?:(?P<year>\d{4})\s*年)?\s*(?P<month>\d{1,2})\s*月\s*(?P<day>\d{1,2})\s*[日号]?"
+    r"(?:\s*(?P<hour>\d{1,2})\s*[:：时点]\s*(?:(?P<minute>\d{1,2})\s*分?)?)?\s*$"
+)
+
+# 推断格式时使用的样本数量
+SAMPLE_SIZE = 50
+
+
+class DateNormalizer:
+    """时间列标准化：每个文件只推断一次主要格式，按批次向量化解析"""
+
+    def __init__(self):
+        # 格式推断缓存：{缓存键（文件路径、修改时间、表格、列）: 主要格式}
+        self.format_cache = {}
+
+    def normalize(self, series, cache_key=None):
+        """解析时间列，返回(解析结果, 无法识别的数量)；空值不计入无法识别"""
+        text = series.where(series.notna(), "").astype(str).str.strip()
+        result = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+        pending = (text != "").to_numpy().copy()
+
+        if not pending.any():
+            return result, 0
+
+        # 先按文件的主要格式整批解析，绝大多数值在这一步完成
+        dominant_format = self.get_dominant_format(text[pending], cache_key)
+        if dominant_format:
+            self.parse_batch(text, result, pending, lambda values: pd.to_datetime(values, format=dominant_format, errors="coerce"))
+
+        # Excel日期序列号（整数或带小数的时间）
+        if pending.any():
+            self.parse_batch(text, result, pending, self.parse_excel_serial)
+
+        # 中文日期，缺少年份时使用已解析时间中最多的年份
+        if pending.any():
+            default_year = self.get_default_year(result)
+            self.parse_batch(text, result, pending, lambda values: self.parse_chinese_date(values, default_year))
+
+        # 剩余的值依次尝试其他格式
+        for fmt in DATE_FORMATS:
+            if not pending.any():
+                break
+            if fmt != dominant_format:
+                self.parse_batch(text, result, pending, lambda values: pd.to_datetime(values, format=fmt, errors="coerce"))
+
+        # 其余少量不规则的值逐个解析
+        if pending.any():
+            self.parse_batch(text, result, pending, lambda values: pd.to_datetime(values, format="mixed", errors="coerce"))
+
+        return result, int(pending.sum())
+
+    def parse_batch(self, text, result, pending, parser):
+        """对尚未解析的值批量调用parser，写入结果并更新pending标记"""
+        positions = pending.nonzero()[0]
+        parsed = pd.Series(parser(text.iloc[positions])).to_numpy()
+        matched = ~pd.isna(parsed)
+        if matched.any():
+            result.iloc[positions[matched]] = parsed[matched]
+            pending[positions[matched]] = False
+
+    def parse_excel_serial(self, values):
+        """解析Excel日期序列号，超出合理范围的数字视为无法识别"""
+        numbers = pd.to_numeric(values, errors="coerce")
+        valid = (numbers >= EXCEL_SERIAL_MIN) & (numbers <= EXCEL_SERIAL_MAX)
+        result = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+        # 只转换范围内的数字，空值参与按单位转换时可能触发溢出错误
+        if valid.any():
+            result[valid] = pd.to_datetime(numbers[valid], unit="D", origin=EXCEL_EPOCH).dt.round("s")
+        return result
+
+    def parse_chinese_date(self, values, default_year):
+        """解析中文日期文本"""
+        parts = values.str.extract(CHINESE_DATE_PATTERN)
+        return pd.to_datetime(pd.DataFrame({
+            "year": pd.to_numeric(parts["year"]).fillna(default_year),
+            "month": pd.to_numeric(parts["month"]),
+            "day": pd.to_numeric(parts["day"]),
+            "hour": pd.to_numeric(parts["hour"]).fillna(0),
+            "minute": pd.to_numeric(parts["minute"]).fillna(0),
+        }), errors="coerce")
+
+    def get_dominant_format(self, text, cache_key=None):
+        """根据样本推断主要格式，同一文件只推断一次"""
+        if cache_key is not None and cache_key in self.format_cache:
+            return self.format_cache[cache_key]
+
+        sample = text.head(SAMPLE_SIZE)
+        best_format, best_count = None, 0
+        for fmt in DATE_FORMATS:
+            count = pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum()
+            if count > best_count:
+                best_format, best_count = fmt, count
+                if count == len(sample):
+                    break
+
+        if cache_key is not None and best_format is not None:
+            self.format_cache[cache_key] = best_format
+        return best_format
+
+    def get_default_year(self, parsed):
+        """取已解析时间中出现最多的年份，全部为空时使用当前年份"""
+        years = parsed.dropna().dt.year
+        if len(years) == 0:
+            return pd.Timestamp.now().year
+        return int(years.mode().iloc[0])
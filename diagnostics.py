@@ -0,0 +1,155 @@
+import json
+import os
+import pandas as pd
+
+# 严重程度
+ERROR = "错误"    # 文件或表格未能合并
+WARNING = "警告"  # 已合并，但需要人工核对
+INFO = "提示"     # 已在输出文件中标记，无需额外处理
+SEVERITIES = [ERROR, WARNING, INFO]
+
+# 合并结果信息中最多列出的问题条数，其余的在检查结果表格中查看或导出
+MESSAGE_LIMIT = 50
+
+# 问题代码及说明
+ISSUE_CODES = {
+    "FILE_NOT_FOUND": "文件不存在",
+    "FILE_UNREADABLE": "无法打开文件",
+    "HEADER_INVALID": "表头不符合要求",
+    "SHEET_READ_FAILED": "表格读取失败",
+    "NO_VALID_SHEET": "没有有效的表格",
+    "DATE_CONVERT_FAILED": "时间格式转换失败",
+    "NO_DATA": "没有有效数据",
+    "TIME_COLUMN_EMPTY": "时间列全为空",
+    "DATE_UNPARSED": "时间无法识别",
+    "MERGE_FAILED": "合并失败",
+    "SNAPSHOT_FAILED": "快照保存失败",
+    "SAVE_FAILED": "保存失败",
+    "TEMPLATE_PARTIAL": "模板部分内容未保留",
+    "DIFF_FAILED": "与上次结果比较失败",
+    "TIME_CONFLICT": "作业时间冲突",
+    "NEAR_DUPLICATE": "疑似重复",
+}
+
+# 导出时的列名，与Issue的字段一一对应
+REPORT_COLUMNS = {
+    "code": "代码",
+    "severity": "严重程度",
+    "file": "文件",
+    "sheet": "表格",
+    "row": "行号",
+    "column": "列",
+    "message": "说明",
+}
+
+
+class Issue:
+    """一条检查结果：代码、严重程度、说明，以及所在的文件、表格、Excel行号和列（可为空）"""
+
+    __slots__ = tuple(REPORT_COLUMNS)
+
+    def __init__(self, code, severity, message, file=None, sheet=None, row=None, column=None):
+        self.code = code
+        self.severity = severity
+        self.message = message
+        self.file = file
+        self.sheet = sheet
+        self.row = row
+        self.column = column
+
+    def location(self):
+        """位置描述，如：a.xlsx 表格'Sheet1' 第8行 工作开始时间列"""
+        parts = []
+        if self.file:
+            parts.append(os.path.basename(self.file))
+        if self.sheet:
+            parts.append(f"表格'{self.sheet}'")
+        if self.row is not None:
+            parts.append(f"第{self.row}行")
+        if self.column:
+            parts.append(f"{self.column}列")
+        return " ".join(parts)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in REPORT_COLUMNS}
+
+    def __str__(self):
+        location = self.location()
+        return f"[{self.severity}] {location}：{self.message}" if location else f"[{self.severity}] {self.message}"
+
+
+class DiagnosticsReport:
+    """合并过程中的检查结果，按发现顺序记录，可导出为JSON或Excel"""
+
+    def __init__(self):
+        self.issues = []
+
+    def add(self, code, severity, message, file=None, sheet=None, row=None, column=None):
+        """记录一条检查结果"""
+        issue = Issue(code, severity, message, file, sheet, row, column)
+        self.issues.append(issue)
+        return issue
+
+    def extend(self, issues):
+        self.issues.extend(issues)
+
+    def clear(self):
+        self.issues = []
+
+    def filter(self, severity=None, code=None):
+        """按严重程度和代码筛选"""
+        return [issue for issue in self.issues
+                if (severity is None or issue.severity == severity) and (code is None or issue.code == code)]
+
+    def count(self, severity=None):
+        if severity is None:
+            return len(self.issues)
+        return sum(1 for issue in self.issues if issue.severity == severity)
+
+    def has_errors(self):
+        return any(issue.severity == ERROR for issue in self.issues)
+
+    def has_warnings(self):
+        """是否有需要提示用户的问题（错误或警告）"""
+        return any(issue.severity in (ERROR, WARNING) for issue in self.issues)
+
+    def summary(self):
+        """各严重程度的数量，如：错误 1 项，警告 3 项"""
+        counts = [f"{severity} {self.count(severity)} 项" for severity in SEVERITIES if self.count(severity)]
+        return "，".join(counts) if counts else "未发现问题"
+
+    def to_text(self, severities=(ERROR, WARNING), limit=None):
+        """按行列出指定严重程度的问题，limit限制列出的条数"""
+        issues = [issue for issue in self.issues if issue.severity in severities]
+        lines = [str(issue) for issue in issues[:limit]]
+        if limit is not None and len(issues) > limit:
+            lines.append(f"……另有 {len(issues) - limit} 项，请导出检查结果查看")
+        return "\n".join(lines)
+
+    def to_frame(self):
+        """转换为数据框，列名为中文"""
+        records = [[getattr(issue, field) for field in REPORT_COLUMNS] for issue in self.issues]
+        frame = pd.DataFrame(records, columns=list(REPORT_COLUMNS.values()))
+        frame["行号"] = frame["行号"].astype("Int64")
+        return frame
+
+    def save_json(self, path):
+        """导出为JSON，字段名使用英文，便于程序汇总"""
+        data = {
+            "summary": {severity: self.count(severity) for severity in SEVERITIES},
+            "codes": ISSUE_CODES,
+            "issues": [issue.to_dict() for issue in self.issues],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def save_excel(self, path):
+        """导出为Excel，每条问题一行"""
+        self.to_frame().to_excel(path, sheet_name="检查结果", index=False)
+
+    def save(self, path):
+        """按扩展名导出为JSON或Excel"""
+        if path.lower().endswith(".json"):
+            self.save_json(path)
+        else:
+            self.save_excel(path)
@@ -1,8 +1,19 @@
 import pandas as pd
 from openpyxl import load_workbook
-from openpyxl.styles import Font, Border, Side, PatternFill, Alignment
+from openpyxl.styles import Font, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
 from datetime import datetime
 import os
+import re
+from template_cache import get_compiled_template
+from date_normalizer import DateNormalizer
+from conflict_detector import detect_conflicts
+from fuzzy_matcher import find_near_duplicates
+import snapshot
+from highlight import HighlightLayer, DUPLICATE, CONFLICT, ADDED, CHANGED
+from merge_diff import load_previous, diff_merges, summarize, write_diff_sheet
+from diagnostics import DiagnosticsReport, Issue, ERROR, WARNING, INFO, MESSAGE_LIMIT
+from streaming_merge import StreamingMerger, DEFAULT_MEMORY_BUDGET_MB
 
 class ExcelProcessor:
     REQUIRED_COLUMNS = [
@@ -11,9 +22,27 @@ class ExcelProcessor:
         "专业", "基准风险等级", "是否需要停电", "施工人数", "是否纳入视频监督", "备注"
     ]
 
+    # 拆分输出方式：按列取值分组，或按工作开始时间所在的周分组
+    PARTITION_WEEK = "周"
+    PARTITION_OPTIONS = ["供电所", PARTITION_WEEK, "专业"]
+
+    # 数据来源列：来源文件、来源表格为整数编码的分类列，来源行号为源表格中的Excel行号
+    PROVENANCE_COLUMNS = ["来源文件", "来源表格", "来源行号"]
+    PROVENANCE_HIDDEN_COLUMNS = "columns"  # 以隐藏列的形式附加在数据右侧
+    PROVENANCE_SHEET = "sheet"  # 单独生成"数据来源"工作表
+
     def __init__(self):
         self.duplicate_rows = []
+        self.conflict_rows = []
+        self.conflicts = []
+        self.near_duplicates = []
+        self.diff = None  # 与上次合并结果的比较结果
+        self.previous_data = None
         self.merged_data = None
+        self.a3_content = None
+        self.provenance = None
+        self.date_normalizer = DateNormalizer()
+        self.report = DiagnosticsReport()  # 最近一次合并的检查结果
 
     def validate_headers_df(self, df):
         """验证数据框的表头结构，返回(是否有效, 错误信息)"""
@@ -41,37 +70,40 @@ class ExcelProcessor:
             return False, f"验证失败：{str(e)}"
 
     def validate_headers(self, file_path):
-        """验证文件的表头结构"""
+        """验证文件的表头结构，验证失败时将问题记录到检查结果中"""
+        issues = []
         try:
             # 尝试从第4行和第5行读取表头
-            errors = []
             for header_row in [3, 4]:  # 因为pandas的header参数是从0开始计数的
                 try:
                     df = pd.read_excel(file_path, header=header_row)
                     is_valid, message = self.validate_headers_df(df)
                     if is_valid:
                         return True, "验证成功"
-                    errors.append(f"第{header_row+1}行作为表头时：{message}")
+                    issues.append(Issue("HEADER_INVALID", ERROR, message,
+                                        file_path, row=header_row + 1))
                 except Exception as e:
-                    errors.append(f"读取第{header_row+1}行失败：{str(e)}")
-            
-            error_message = "表头验证失败：\n"
-            error_message += "\n".join(errors)
-            return False, error_message
+                    issues.append(Issue("SHEET_READ_FAILED", ERROR, f"读取表头失败：{str(e)}",
+                                        file_path, row=header_row + 1))
         except Exception as e:
-            return False, f"文件读取失败：{str(e)}"
+            issues.append(Issue("FILE_UNREADABLE", ERROR, f"文件读取失败：{str(e)}", file_path))
+        
+        self.report.extend(issues)
+        return False, "表头验证失败：\n" + "\n".join(str(issue) for issue in issues)
+
+    def process_file(self, file_path, with_provenance=False):
+        """处理单个Excel文件，with_provenance为True时附加来源表格和来源行号列
 
-    def process_file(self, file_path):
-        """处理单个Excel文件"""
+        无法识别的时间逐个记录到检查结果中；没有有效表格时记录各表格的验证结果，返回的信息由这些记录生成。
+        """
+        issues = []
         try:
             # 获取Excel文件中的所有表格
             xl = pd.ExcelFile(file_path)
             sheet_names = xl.sheet_names
 
             # 依次验证每个表格
-            all_errors = []
             for sheet_name in sheet_names:
-                sheet_errors = []
                 try:
                     # 尝试从第4行和第5行读取表头，使用engine='openpyxl'并忽略公式错误
                     for header_row in [3, 4]:  # 因为pandas的header参数是从0开始计数的
@@ -96,89 +128,128 @@ class ExcelProcessor:
                                 # 删除完全空白的行
                                 df = df.dropna(how='all')
                                 
-                                # 处理时间格式
+                                # 记录数据来源（此时索引仍对应表头下方的原始行）
+                                if with_provenance:
+                                    df['来源表格'] = sheet_name
+                                    df['来源行号'] = (df.index + header_row + 2).astype('int32')
+                                
+                                # 处理时间格式（同一文件的两列共用推断出的主要格式）
                                 try:
-                                    df['工作开始时间'] = pd.to_datetime(df['工作开始时间'], errors='coerce')
-                                    df['工作结束时间'] = pd.to_datetime(df['工作结束时间'], errors='coerce')
+                                    self.normalize_dates(df, file_path, sheet_name, header_row + 2)
                                 except Exception as e:
-                                    return None, f"时间格式转换失败：{str(e)}"
+                                    issue = self.report.add("DATE_CONVERT_FAILED", ERROR,
+                                                            f"时间格式转换失败：{str(e)}", file_path, sheet_name)
+                                    return None, str(issue)
                                 
                                 # 重置索引
                                 df = df.reset_index(drop=True)
                                 
                                 return df, f"使用表格：{sheet_name}"
                             else:
-                                sheet_errors.append(f"第{header_row+1}行作为表头时：{message}")
+                                issues.append(Issue("HEADER_INVALID", ERROR, message,
+                                                    file_path, sheet_name, header_row + 1))
                         except Exception as e:
-                            sheet_errors.append(f"读取第{header_row+1}行失败，请检查Excel文件格式是否正确，确保没有合并单元格或特殊格式：{str(e)}")
+                            issues.append(Issue("SHEET_READ_FAILED", ERROR,
+                                                f"读取失败，请检查Excel文件格式是否正确，确保没有合并单元格或特殊格式：{str(e)}",
+                                                file_path, sheet_name, header_row + 1))
                 except Exception as e:
-                    sheet_errors.append(f"处理失败：{str(e)}")
-                
-                if sheet_errors:
-                    all_errors.append(f"\n表格 '{sheet_name}' 验证结果：\n" + "\n".join(sheet_errors))
+                    issues.append(Issue("SHEET_READ_FAILED", ERROR, f"处理失败：{str(e)}", file_path, sheet_name))
 
             # 如果所有表格都验证失败
-            error_message = f"文件 {os.path.basename(file_path)} 中没有找到有效的表格结构：\n"
-            error_message += "\n".join(all_errors)
-            return None, error_message
-
+            issues.append(Issue("NO_VALID_SHEET", ERROR, "没有找到有效的表格结构", file_path))
         except Exception as e:
-            return None, f"处理失败：{str(e)}"
+            issues.append(Issue("FILE_UNREADABLE", ERROR, f"处理失败：{str(e)}", file_path))
+        
+        self.report.extend(issues)
+        error_message = f"文件 {os.path.basename(file_path)} 中没有找到有效的表格结构：\n"
+        error_message += "\n".join(str(issue) for issue in issues)
+        return None, error_message
 
-    def merge_files(self, file_paths):
-        """合并多个Excel文件"""
+    def normalize_dates(self, df, file_path, sheet_name, row_offset, max_issues=None):
+        """转换两列时间格式，无法识别的时间逐个记录到检查结果中，返回无法识别的数量
+
+        row_offset为数据框索引与Excel行号之差；max_issues限制逐个记录的条数，为None时全部记录。
+        """
+        # 格式推断按文件内容缓存：文件修改后重新合并时重新推断，各表格、各列分别推断
+        cache_key = (os.path.abspath(file_path), os.path.getmtime(file_path), sheet_name)
+        failures = 0
+        for column in ['工作开始时间', '工作结束时间']:
+            parsed, count = self.date_normalizer.normalize(df[column], cache_key + (column,))
+            if count:
+                # 非空但未能解析的值（与normalize一致，只含空白的值视为空）
+                text = df[column].fillna('').astype(str).str.strip()
+                unparsed = df[column][(text != '') & parsed.isna()]
+                if max_issues is not None:
+                    unparsed = unparsed.head(max(max_issues - failures, 0))
+                for label, value in unparsed.items():
+                    self.report.add("DATE_UNPARSED", WARNING, f"无法识别的时间'{value}'，已按空值处理",
+                                    file_path, sheet_name, int(label) + row_offset, column)
+            df[column] = parsed
+            failures += count
+        return failures
+
+    def merge_files(self, file_paths, snapshot_path=None):
+        """合并多个Excel文件，指定snapshot_path时将合并结果另存为快照"""
         all_data = []
-        all_errors = []
+        self.report = DiagnosticsReport()
         self.a3_content = None  # 新增属性存储A2/A3内容
+        self.provenance = None
+        self.diff = None
+        
+        # 来源文件编号，重复选择的同一文件使用同一编号
+        source_files = list(dict.fromkeys(file_paths))
         
         for file_path in file_paths:
             try:
                 # 首先验证文件是否存在
                 if not os.path.exists(file_path):
-                    all_errors.append(f"文件不存在：{file_path}")
+                    self.report.add("FILE_NOT_FOUND", ERROR, "文件不存在", file_path)
                     continue
                     
                 # 验证文件是否可以打开
                 try:
                     xl = pd.ExcelFile(file_path)
                 except Exception as e:
-                    all_errors.append(f"无法打开文件 {os.path.basename(file_path)}：{str(e)}")
+                    self.report.add("FILE_UNREADABLE", ERROR, f"无法打开文件：{str(e)}", file_path)
                     continue
                 
                 # 处理文件
-                df, message = self.process_file(file_path)
+                df, message = self.process_file(file_path, with_provenance=True)
                 if df is not None:
                     # 验证数据有效性
                     if len(df) == 0:
-                        all_errors.append(f"文件 {os.path.basename(file_path)} 没有有效数据")
+                        self.report.add("NO_DATA", ERROR, "没有有效数据", file_path)
                         continue
                     
                     # 验证必要列的数据类型
                     try:
                         # 验证时间格式
                         if pd.isna(df['工作开始时间']).all() or pd.isna(df['工作结束时间']).all():
-                            all_errors.append(f"文件 {os.path.basename(file_path)} 的时间列全为空")
+                            self.report.add("TIME_COLUMN_EMPTY", ERROR, "时间列全为空", file_path)
                             continue
-                            
+                        
+                        df['来源文件'] = pd.Series(source_files.index(file_path), index=df.index, dtype='int16')
                         all_data.append(df)
                     except Exception as e:
-                        all_errors.append(f"文件 {os.path.basename(file_path)} 数据验证失败：{str(e)}")
+                        self.report.add("NO_DATA", ERROR, f"数据验证失败：{str(e)}", file_path)
                         continue
-                else:
-                    all_errors.append(message)
             except Exception as e:
-                all_errors.append(f"处理文件 {os.path.basename(file_path)} 时出错：{str(e)}")
+                self.report.add("MERGE_FAILED", ERROR, f"处理文件时出错：{str(e)}", file_path)
         
         # 如果没有有效数据
         if not all_data:
             error_message = "合并失败，没有有效数据可合并。\n\n详细错误信息：\n"
-            error_message += "\n".join(all_errors)
+            error_message += self.report.to_text(limit=MESSAGE_LIMIT)
             return None, error_message
         
         try:
             # 合并所有数据
             self.merged_data = pd.concat(all_data, ignore_index=True)
             
+            # 将数据来源拆分为单独的数据框，避免影响重复检查和输出
+            self.provenance = self.build_provenance(self.merged_data, source_files)
+            self.merged_data = self.merged_data.drop(columns=self.PROVENANCE_COLUMNS)
+            
             # 从第一个文件中获取A2/A3内容
             if file_paths:
                 try:
@@ -192,6 +263,7 @@ class ExcelProcessor:
             
             # 验证合并后的数据
             if len(self.merged_data) == 0:
+                self.report.add("NO_DATA", ERROR, "合并后的数据为空")
                 return None, "合并后的数据为空"
             
             # 删除只有序号列有内容的行
@@ -199,31 +271,168 @@ class ExcelProcessor:
             
             # 验证是否还有数据
             if len(self.merged_data) == 0:
+                self.report.add("NO_DATA", ERROR, "删除无效行后没有剩余数据")
                 return None, "删除无效行后没有剩余数据"
             
             # 按工作开始时间排序
             try:
                 self.merged_data = self.merged_data.sort_values('工作开始时间')
             except Exception as e:
+                self.report.add("MERGE_FAILED", ERROR, f"排序失败：{str(e)}")
                 return None, f"排序失败：{str(e)}"
             
             # 重置索引
+            self.provenance = self.provenance.loc[self.merged_data.index].reset_index(drop=True)
             self.merged_data = self.merged_data.reset_index(drop=True)
             
             # 检查重复行
             self.check_duplicates()
             
+            # 检查疑似重复行
+            self.check_near_duplicates()
+            
+            # 检查作业时间冲突
+            self.check_conflicts()
+            
+            # 将疑似重复和时间冲突按源文件位置记录到检查结果中
+            self.report_row_issues()
+            
+            # 保存快照
+            if snapshot_path:
+                success, message = self.save_snapshot(snapshot_path)
+                if not success:
+                    self.report.add("SNAPSHOT_FAILED", WARNING, message, snapshot_path)
+            
             # 如果有错误但仍有可合并的数据，返回警告信息
-            if all_errors:
-                return self.merged_data, f"部分文件合并成功，但存在以下问题：\n" + "\n".join(all_errors)
+            if self.report.has_warnings():
+                return self.merged_data, f"合并完成，但存在以下问题：\n" + self.report.to_text(limit=MESSAGE_LIMIT)
             
             return self.merged_data, "合并成功"
             
         except Exception as e:
+            self.report.add("MERGE_FAILED", ERROR, f"合并数据时出错：{str(e)}")
             error_message = f"合并数据时出错：{str(e)}\n\n此前的错误信息：\n"
-            error_message += "\n".join(all_errors)
+            error_message += self.report.to_text(limit=MESSAGE_LIMIT)
             return None, error_message
 
+    def report_row_issues(self):
+        """将疑似重复和时间冲突记录到检查结果中，位置为第一行在源文件中的位置，说明中给出合并结果中的序号"""
+        provenance = self.get_provenance(self.merged_data)
+        
+        def source(row):
+            if provenance is None:
+                return None, None, None
+            return (provenance['来源文件'].iat[row], provenance['来源表格'].iat[row],
+                    int(provenance['来源行号'].iat[row]))
+        
+        def describe(row):
+            file_name, sheet_name, source_row = source(row)
+            if file_name is None:
+                return f"第{row + 1}项"
+            return f"第{row + 1}项（{os.path.basename(file_name)} 第{source_row}行）"
+        
+        for item in self.near_duplicates:
+            first, second = item['rows']
+            self.report.add("NEAR_DUPLICATE", WARNING,
+                            f"{describe(first)}与{describe(second)}疑似重复（相似度{item['score']:.0%}），请核对",
+                            *source(first))
+        for item in self.conflicts:
+            first, second = item['rows']
+            self.report.add("TIME_CONFLICT", INFO,
+                            f"{describe(first)}与{describe(second)}{item['type']}：{item['key']}",
+                            *source(first))
+
+    def merge_files_streaming(self, file_paths, template_path, output_path,
+                              memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        """大文件模式：分块排序归并后直接写入输出文件，内存占用不随文件大小增长
+
+        该模式只标记完全重复行，不检查时间冲突和疑似重复，也不输出数据来源。
+        """
+        self.merged_data = None
+        self.provenance = None
+        self.duplicate_rows = []
+        self.conflicts, self.conflict_rows = [], []
+        self.near_duplicates = []
+        self.diff = None
+        self.report = DiagnosticsReport()
+        merger = StreamingMerger(self, memory_budget_mb)
+        return merger.merge(file_paths, template_path, output_path)
+
+    def save_snapshot(self, snapshot_path):
+        """将合并结果、重复行和数据来源保存为按列存储的快照"""
+        if self.merged_data is None:
+            return False, "没有数据可保存"
+        
+        try:
+            extra = {
+                'a3_content': self.a3_content,
+                'conflict_rows': [int(row) for row in self.conflict_rows],
+                'conflicts': [{**item, 'rows': [int(row) for row in item['rows']]} for item in self.conflicts],
+                'near_duplicates': [{**item, 'rows': [int(row) for row in item['rows']]} for item in self.near_duplicates],
+            }
+            snapshot.save_snapshot(snapshot_path, self.merged_data, self.duplicate_rows, self.provenance, extra)
+            return True, "快照保存成功"
+        except Exception as e:
+            return False, f"快照保存失败：{str(e)}"
+
+    def load_snapshot(self, snapshot_path):
+        """读取快照作为合并结果，无需重新合并即可再次输出"""
+        try:
+            merged_data, duplicate_rows, provenance, extra = snapshot.load_snapshot(snapshot_path)
+        except Exception as e:
+            return None, f"快照读取失败：{str(e)}"
+        
+        self.merged_data = merged_data
+        self.duplicate_rows = duplicate_rows
+        self.provenance = provenance
+        self.a3_content = extra.get('a3_content')
+        self.conflict_rows = extra.get('conflict_rows', [])
+        self.conflicts = [{**item, 'rows': tuple(item['rows'])} for item in extra.get('conflicts', [])]
+        self.near_duplicates = [{**item, 'rows': tuple(item['rows'])} for item in extra.get('near_duplicates', [])]
+        self.diff = None
+        return self.merged_data, "快照读取成功"
+
+    def compare_with_previous(self, previous_path):
+        """与上次的合并结果（输出的审批表或快照目录）比较，返回(比较结果, 信息)，比较结果同时保存在self.diff中"""
+        self.diff = None
+        if self.merged_data is None:
+            return None, "没有数据可比较"
+        
+        try:
+            self.previous_data = load_previous(previous_path, self.REQUIRED_COLUMNS)
+            self.diff = diff_merges(self.previous_data, self.merged_data, self.REQUIRED_COLUMNS)
+        except Exception as e:
+            self.report.add("DIFF_FAILED", WARNING, f"与上次结果比较失败：{str(e)}", previous_path)
+            return None, f"与上次结果比较失败：{str(e)}"
+        return self.diff, summarize(self.diff)
+
+    def get_diff(self, merged_data):
+        """获取与数据对应的比较结果，数据不是本次合并结果时返回None"""
+        if self.diff is None or merged_data is not self.merged_data:
+            return None
+        return self.diff
+
+    def build_provenance(self, merged_data, source_files):
+        """从合并数据中提取数据来源，文件名和表格名以分类列存储"""
+        file_names = [os.path.basename(f) for f in source_files]
+        if len(set(file_names)) != len(file_names):
+            # 不同目录下存在同名文件时使用完整路径区分
+            file_names = list(source_files)
+        
+        return pd.DataFrame({
+            '来源文件': pd.Categorical.from_codes(merged_data['来源文件'].to_numpy(), categories=file_names),
+            '来源表格': merged_data['来源表格'].astype('category'),
+            '来源行号': merged_data['来源行号'].astype('int32'),
+        }, index=merged_data.index)
+
+    def get_provenance(self, merged_data):
+        """获取与数据对应的来源信息，数据不是本次合并结果时返回None"""
+        if self.provenance is None or len(self.provenance) != len(merged_data):
+            return None
+        if not self.provenance.index.equals(merged_data.index):
+            return None
+        return self.provenance
+
     def check_duplicates(self):
         """检查并标记重复行"""
         if self.merged_data is None:
@@ -233,94 +442,59 @@ class ExcelProcessor:
         duplicates = self.merged_data[self.merged_data.duplicated(keep='first')]
         self.duplicate_rows = duplicates.index.tolist()
 
-    def save_output(self, template_path, merged_data, output_path):
-        """保存处理后的文件到模板"""
+    def check_near_duplicates(self, threshold=None):
+        """查找作业类型和施工地点相近的疑似重复行对，已标记的完全重复行不参与检查"""
+        if self.merged_data is None:
+            return
+        
+        if threshold is None:
+            self.near_duplicates = find_near_duplicates(self.merged_data, exclude_rows=self.duplicate_rows)
+        else:
+            self.near_duplicates = find_near_duplicates(self.merged_data, threshold, self.duplicate_rows)
+
+    def check_conflicts(self):
+        """检查同一施工地点或同一工作负责人作业时间重叠的行，重复行不参与检查"""
+        if self.merged_data is None:
+            return
+        
+        self.conflicts, self.conflict_rows = detect_conflicts(self.merged_data, self.duplicate_rows)
+
+    def save_output(self, template_path, merged_data, output_path, provenance_mode=None, with_diff=False):
+        """保存处理后的文件到模板，provenance_mode可选择以隐藏列或单独工作表输出数据来源
+
+        with_diff为True且已与上次结果比较时，标记新增行和修改的单元格，并生成"变更情况"工作表。
+        """
         if merged_data is None:
             return False, "没有数据可保存"
         
         try:
-            # 加载模板文件
-            wb = load_workbook(template_path)
-            ws = wb.active
-            
-            # 写入A3内容
-            if self.a3_content:
-                ws['A3'].value = self.a3_content
-            
-            # 保存原始列宽
-            original_column_widths = {}
-            for column in ws.columns:
-                col_letter = column[0].column_letter
-                original_column_widths[col_letter] = ws.column_dimensions[col_letter].width
-            
-            # 获取数据行数
-            data_rows = len(merged_data)
-            
-            # 从第7行开始写入数据
-            for row_idx, row_data in enumerate(merged_data.itertuples(), start=7):
-                max_text_lines = 1  # 记录当前行中最大的文本行数
-                
-                for col_idx, value in enumerate(row_data[1:], start=1):  # 跳过索引列
-                    cell = ws.cell(row=row_idx, column=col_idx)
-                    
-                    # 处理序号列
-                    if col_idx == 1:  # 序号列
-                        cell.value = row_idx - 6  # 从1开始递增
-                    # 处理时间格式
-                    elif col_idx in [7, 8]:  # 工作开始时间和工作结束时间列
-                        if pd.notna(value):  # 检查是否为空
-                            cell.value = value.strftime("%Y-%m-%d")
-                    else:
-                        cell.value = value
-                    
-                    # 设置字体
-                    cell.font = Font(name='宋体', size=9)
-                    
-                    # 设置对齐方式
-                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                    
-                    # 设置边框
-                    cell.border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
-                    )
-                    
-                    # 计算文本行数
-                    if value and isinstance(value, str):
-                        # 获取列宽
-                        col_letter = cell.column_letter
-                        col_width = original_column_widths.get(col_letter, 10)  # 默认宽度为10
-                        
-                        # 估算每行可以容纳的字符数（假设中文字符宽度为2，英文字符宽度为1）
-                        chars_per_line = int(col_width / 2)  # 保守估计
-                        if chars_per_line < 1:
-                            chars_per_line = 1
-                        
-                        # 计算文本行数
-                        text_length = sum(2 if '\u4e00' <= char <= '\u9fff' else 1 for char in str(value))
-                        lines = (text_length + chars_per_line - 1) // chars_per_line
-                        max_text_lines = max(max_text_lines, lines)
-            
-                # 设置行高（每行文字高度为8个单位，额外加10个单位作为边距）
-                row_height = max(40, max_text_lines * 6 + 10)
-                # 添加行高上限限制
-                if row_height > 180:
-                    row_height = 84
-                ws.row_dimensions[row_idx].height = row_height
-            
-            # 标记重复行
-            light_red = PatternFill(start_color='FFB6C1', end_color='FFB6C1', fill_type='solid')
-            for row_idx in self.duplicate_rows:
-                for col in range(1, len(self.REQUIRED_COLUMNS) + 1):
-                    cell = ws.cell(row=row_idx + 7, column=col)  # +7 因为数据从第7行开始
-                    cell.fill = light_red
-            
-            # 恢复原始列宽
-            for col_letter, width in original_column_widths.items():
-                if width is not None:  # 只恢复有设置过宽度的列
-                    ws.column_dimensions[col_letter].width = width
+            # 从预解析的模板生成工作簿
+            template = get_compiled_template(template_path)
+            wb, ws = template.stamp()
+            
+            # 标记与上次相比新增的行（整行，低于时间冲突和重复行）和修改的单元格（单个单元格，高于整行标记）
+            diff = self.get_diff(merged_data) if with_diff else None
+            highlights = HighlightLayer(first_row=template.data_start_row)
+            overlays = HighlightLayer(first_row=template.data_start_row)
+            if diff is not None:
+                highlights.add_rows(ADDED, diff['added'], range(len(self.REQUIRED_COLUMNS)))
+                for item in diff['changed']:
+                    columns = [merged_data.columns.get_loc(column) for column in item['columns']]
+                    overlays.add_rows(CHANGED, [item['new']], columns)
+            
+            # 写入数据并标记重复行和时间冲突行
+            self.write_data(ws, merged_data, self.duplicate_rows, template.column_widths, template.data_start_row,
+                            self.conflict_rows, highlights, overlays=overlays)
+            
+            # 输出数据来源
+            provenance = self.get_provenance(merged_data)
+            if provenance_mode and provenance is not None:
+                self.write_provenance(wb, ws, merged_data, provenance, self.duplicate_rows,
+                                      template.data_start_row, provenance_mode)
+            
+            # 输出变更情况
+            if diff is not None:
+                write_diff_sheet(wb, diff, self.previous_data, merged_data, self.REQUIRED_COLUMNS)
             
             # 保存为新文件
             wb.save(output_path)
@@ -328,6 +502,222 @@ class ExcelProcessor:
         except Exception as e:
             return False, f"保存失败：{str(e)}"
 
+    def write_data(self, ws, merged_data, duplicate_rows, original_column_widths, data_start_row=7, conflict_rows=(),
+                   highlights=None, title=None, overlays=None):
+        """将数据写入模板工作表，duplicate_rows、conflict_rows为需要标记的行位置（从0开始）
+
+        highlights为已添加其他标记的HighlightLayer，同一单元格以时间冲突和重复行标记为准；
+        overlays中的标记在时间冲突和重复行之后添加，同一单元格以overlays为准。
+        title为A3标题，默认使用源文件的标题。
+        """
+        # 写入A3内容
+        title = title if title is not None else self.a3_content
+        if title:
+            ws['A3'].value = title
+        
+        # 字体、对齐方式和边框所有单元格共用
+        font = Font(name='宋体', size=9)
+        alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        
+        # 从数据起始行（默认第7行）开始写入数据
+        for row_idx, row_data in enumerate(merged_data.itertuples(), start=data_start_row):
+            for col_idx, value in enumerate(row_data[1:], start=1):  # 跳过索引列
+                cell = ws.cell(row=row_idx, column=col_idx)
+                
+                # 处理序号列
+                if col_idx == 1:  # 序号列
+                    cell.value = row_idx - data_start_row + 1  # 从1开始递增
+                # 处理时间格式
+                elif col_idx in [7, 8]:  # 工作开始时间和工作结束时间列
+                    if pd.notna(value):  # 检查是否为空
+                        cell.value = value.strftime("%Y-%m-%d")
+                else:
+                    cell.value = value
+                
+                # 设置字体、对齐方式和边框
+                cell.font = font
+                cell.alignment = alignment
+                cell.border = border
+            
+            # 根据文本长度设置行高
+            ws.row_dimensions[row_idx].height = self.calculate_row_height(row_data[1:], original_column_widths)
+        
+        # 标记时间冲突行和重复行（同时属于两者时按重复行标记），共享样式一次性应用
+        if highlights is None:
+            highlights = HighlightLayer(first_row=data_start_row)
+        marked_columns = range(len(self.REQUIRED_COLUMNS))
+        highlights.add_rows(CONFLICT, conflict_rows, marked_columns)
+        highlights.add_rows(DUPLICATE, duplicate_rows, marked_columns)
+        if overlays is not None:
+            highlights.extend(overlays)
+        highlights.apply(ws)
+        
+        # 恢复原始列宽
+        for col_letter, width in original_column_widths.items():
+            if width is not None:  # 只恢复有设置过宽度的列
+                ws.column_dimensions[col_letter].width = width
+
+    def write_provenance(self, wb, ws, merged_data, provenance, duplicate_rows, data_start_row, mode):
+        """写入数据来源：隐藏列附加在数据右侧，或生成单独的"数据来源"工作表"""
+        duplicate_set = set(duplicate_rows)
+        
+        if mode == self.PROVENANCE_HIDDEN_COLUMNS:
+            first_col = len(merged_data.columns) + 1
+            for offset, column in enumerate(self.PROVENANCE_COLUMNS):
+                col_idx = first_col + offset
+                ws.cell(row=data_start_row - 1, column=col_idx).value = column
+                for row_idx, value in enumerate(provenance[column], start=data_start_row):
+                    ws.cell(row=row_idx, column=col_idx).value = value if isinstance(value, str) else int(value)
+                ws.column_dimensions[get_column_letter(col_idx)].hidden = True
+        elif mode == self.PROVENANCE_SHEET:
+            source_ws = wb.create_sheet("数据来源")
+            source_ws.append(["序号"] + self.PROVENANCE_COLUMNS + ["是否重复"])
+            for pos, (file_name, sheet_name, row_number) in enumerate(provenance.itertuples(index=False)):
+                source_ws.append([pos + 1, file_name, sheet_name, int(row_number),
+                                  "是" if pos in duplicate_set else ""])
+            for col_letter, width in zip("ABCDE", [8, 40, 20, 10, 10]):
+                source_ws.column_dimensions[col_letter].width = width
+        else:
+            raise ValueError(f"不支持的数据来源输出方式：{mode}")
+
+    def calculate_row_height(self, values, original_column_widths):
+        """根据一行中各单元格的文本长度估算行高"""
+        max_text_lines = 1  # 记录当前行中最大的文本行数
+        
+        for col_idx, value in enumerate(values, start=1):
+            # 计算文本行数
+            if value and isinstance(value, str):
+                # 获取列宽
+                col_letter = get_column_letter(col_idx)
+                col_width = original_column_widths.get(col_letter, 10)  # 默认宽度为10
+                
+                # 估算每行可以容纳的字符数（假设中文字符宽度为2，英文字符宽度为1）
+                chars_per_line = int(col_width / 2)  # 保守估计
+                if chars_per_line < 1:
+                    chars_per_line = 1
+                
+                # 计算文本行数
+                text_length = sum(2 if '\u4e00' <= char <= '\u9fff' else 1 for char in str(value))
+                lines = (text_length + chars_per_line - 1) // chars_per_line
+                max_text_lines = max(max_text_lines, lines)
+        
+        # 设置行高（每行文字高度为8个单位，额外加10个单位作为边距）
+        row_height = max(40, max_text_lines * 6 + 10)
+        # 添加行高上限限制
+        if row_height > 180:
+            row_height = 84
+        return row_height
+
+    def get_partition_keys(self, merged_data, partition_by):
+        """计算每行数据所属的拆分分组名称"""
+        if partition_by == self.PARTITION_WEEK:
+            # 按工作开始时间所在的自然周（周一至周日）分组，名称为周一的年份加上与模板A3一致的日期范围，如"2025.3.24-3.30"
+            start_time = pd.to_datetime(merged_data['工作开始时间'], errors='coerce')
+            monday = (start_time - pd.to_timedelta(start_time.dt.weekday, unit='D')).dt.normalize()
+            sunday = monday + pd.Timedelta(days=6)
+            keys = (monday.dt.year.astype('Int64').astype(str) + '.'
+                    + monday.dt.month.astype('Int64').astype(str) + '.' + monday.dt.day.astype('Int64').astype(str) + '-'
+                    + sunday.dt.month.astype('Int64').astype(str) + '.' + sunday.dt.day.astype('Int64').astype(str))
+            return keys.where(start_time.notna(), '时间未填写')
+        
+        if partition_by not in merged_data.columns:
+            raise ValueError(f"不支持的拆分方式：{partition_by}")
+        
+        keys = merged_data[partition_by].astype(str).str.strip()
+        return keys.where(merged_data[partition_by].notna() & (keys != ''), '未填写')
+
+    def get_partition_title(self, key, partition_by):
+        """分组文件的A3标题：按周拆分时将标题中的年月和日期范围替换为该周的，其他方式沿用合并结果的标题"""
+        match = re.fullmatch(r'(\d{4})\.(\d{1,2})\.(\d{1,2})-(\d{1,2}\.\d{1,2})', key)
+        if partition_by != self.PARTITION_WEEK or not self.a3_content or match is None:
+            return self.a3_content
+        
+        year, month, day, sunday = match.groups()
+        monday = pd.Timestamp(int(year), int(month), int(day))
+        week_range = f"{int(month)}.{int(day)}-{sunday}"
+        title = str(self.a3_content)
+        
+        # 年月按该周周四所在的月份（一周中大部分日期所在的月份）
+        thursday = monday + pd.Timedelta(days=3)
+        title = re.sub(r'\d{4}年\d{1,2}月', f"{thursday.year}年{thursday.month}月", title, count=1)
+        
+        range_pattern = r'\d{1,2}\.\d{1,2}\s*[-－—~～至]\s*\d{1,2}\.\d{1,2}'
+        if re.search(range_pattern, title):
+            return re.sub(range_pattern, week_range, title, count=1)
+        return f"{title}（{week_range}）"
+
+    def get_partition_file_name(self, key, file_prefix, used_names):
+        """分组文件名（不含扩展名）：替换文件名中不允许的字符，与已使用的文件名相同时依次加上"_2"、"_3"等后缀"""
+        safe_key = re.sub(r'[\\/:*?"<>|]', '_', key)
+        base_name = f"{file_prefix}_{safe_key}"
+        name, suffix = base_name, 1
+        while name.lower() in used_names:
+            suffix += 1
+            name = f"{base_name}_{suffix}"
+        used_names.add(name.lower())
+        return name
+
+    def save_partitioned_output(self, template_path, merged_data, output_dir, partition_by, file_prefix,
+                                provenance_mode=None):
+        """按供电所/周/专业拆分，每个分组单独生成一个模板文件"""
+        if merged_data is None:
+            return False, "没有数据可保存"
+        
+        try:
+            # 模板只解析一次，各分组从预解析的模板生成
+            template = get_compiled_template(template_path)
+            
+            # 一次性完成分组
+            keys = self.get_partition_keys(merged_data, partition_by)
+            duplicate_set = set(self.duplicate_rows)
+            conflict_set = set(self.conflict_rows)
+            provenance = self.get_provenance(merged_data)
+            
+            os.makedirs(output_dir, exist_ok=True)
+            
+            used_names = set()  # 本次已使用的文件名（不区分大小写）
+            
+            def write_partition(key, group):
+                # 每个分组单独重新编号，重复行按分组内位置标记
+                duplicate_rows = [pos for pos, label in enumerate(group.index) if label in duplicate_set]
+                conflict_rows = [pos for pos, label in enumerate(group.index) if label in conflict_set]
+                wb, ws = template.stamp()
+                self.write_data(ws, group.reset_index(drop=True), duplicate_rows,
+                                template.column_widths, template.data_start_row, conflict_rows,
+                                title=self.get_partition_title(key, partition_by))
+                if provenance_mode and provenance is not None:
+                    self.write_provenance(wb, ws, group, provenance.loc[group.index], duplicate_rows,
+                                          template.data_start_row, provenance_mode)
+                output_path = os.path.join(output_dir, f"{self.get_partition_file_name(key, file_prefix, used_names)}.xlsx")
+                wb.save(output_path)
+                return output_path
+            
+            # 依次写出各分组文件（写入单元格受GIL限制，多线程并不能加快）
+            output_files = []
+            errors = []
+            for key, group in merged_data.groupby(keys, sort=False):
+                try:
+                    output_files.append(write_partition(key, group))
+                except Exception as e:
+                    errors.append(self.report.add("SAVE_FAILED", ERROR, f"分组 {key} 保存失败：{str(e)}", output_dir))
+            
+            if not output_files:
+                return False, "保存失败：\n" + "\n".join(issue.message for issue in errors)
+            
+            message = f"保存成功，共生成 {len(output_files)} 个文件：\n"
+            message += "\n".join(os.path.basename(f) for f in output_files)
+            if errors:
+                message += "\n\n但存在以下问题：\n" + "\n".join(issue.message for issue in errors)
+            return True, message
+        except Exception as e:
+            return False, f"保存失败：{str(e)}"
+
     def process_files(self, files):
         """处理多个Excel文件"""
         try:
@@ -5,7 +5,8 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton,
 from PySide6.QtCore import Qt
 import pandas as pd
 from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
+from openpyxl.utils import column_index_from_string
+from highlight import HighlightLayer, VIOLATION
 
 class FilePreviewWindow(QWidget):
     def __init__(self):
@@ -134,8 +135,13 @@ class FilePreviewWindow(QWidget):
             # 清空表格
             self.table.setRowCount(0)
             
-            # 创建黄色填充样式
-            yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+            # 不规范的单元格先记录下来，检查完成后统一标记为黄色
+            highlights = HighlightLayer()
+            marked_rows, marked_cols = [], []
+            
+            def mark(col, row):
+                marked_rows.append(row - 1)
+                marked_cols.append(column_index_from_string(col) - 1)
             
             # 存储不规范的行
             invalid_rows = []
@@ -146,7 +152,7 @@ class FilePreviewWindow(QWidget):
                 for col in ['B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N']:
                     cell_value = str(ws[f'{col}{row}'].value).strip()
                     if not cell_value or cell_value == 'None':
-                        ws[f'{col}{row}'].fill = yellow_fill
+                        mark(col, row)
                         invalid_rows.append({
                             'row': row,
                             'b': f'{col}列为空',
@@ -167,9 +173,9 @@ class FilePreviewWindow(QWidget):
                     if d_value not in b_value or d_value not in f_value:
                         # 标记不规范的单元格
                         if d_value not in b_value:
-                            ws[f'B{row}'].fill = yellow_fill
+                            mark('B', row)
                         if d_value not in f_value:
-                            ws[f'F{row}'].fill = yellow_fill
+                            mark('F', row)
                             
                         # 添加到不规范行列表
                         invalid_rows.append({
@@ -185,7 +191,7 @@ class FilePreviewWindow(QWidget):
                 n_value = str(ws[f'N{row}'].value).strip()
                 
                 if k_value == "可接受" and n_value != "否":
-                    ws[f'N{row}'].fill = yellow_fill
+                    mark('N', row)
                     invalid_rows.append({
                         'row': row,
                         'b': '可接受',
@@ -194,7 +200,7 @@ class FilePreviewWindow(QWidget):
                         'type': '可接受风险'
                     })
                 elif k_value == "低风险" and n_value != "是":
-                    ws[f'N{row}'].fill = yellow_fill
+                    mark('N', row)
                     invalid_rows.append({
                         'row': row,
                         'b': '低风险',
@@ -203,7 +209,9 @@ class FilePreviewWindow(QWidget):
                         'type': '低风险'
                     })
             
-            # 保存修改后的文件
+            # 标记不规范的单元格并保存修改后的文件
+            highlights.add_cells(VIOLATION, marked_rows, marked_cols)
+            highlights.apply(ws)
             wb.save(self.current_file)
             
             # 显示不规范的行
@@ -0,0 +1,124 @@
+import re
+import unicodedata
+import zlib
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+# 参与相似度比较的文本列，以及分块使用的列（同一天、同一施工单位的行才互相比较）
+TEXT_COLUMNS = ["作业类型（内容）", "施工地点"]
+BLOCK_COLUMN = "施工单位"
+
+DEFAULT_THRESHOLD = 0.8  # 各文本列相似度的平均值达到该值视为疑似重复
+NGRAM_SIZE = 2
+
+# 分块内行数不超过该值时直接两两比较，超过时先用MinHash分段筛选候选对
+EXACT_BLOCK_SIZE = 50
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 每段 64 / 16 = 4 个哈希值
+HASH_PRIME = 4294967291  # 小于2^32的最大质数
+
+_PUNCTUATION = re.compile(r"[\s\W_]+")
+
+
+def normalize_text(value):
+    """统一全角/半角、大小写，去掉空白和标点"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).lower()
+    return _PUNCTUATION.sub("", text)
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    """文本的字符n-gram集合，地址顺序调整后大部分n-gram仍然相同"""
+    if len(text) < size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(first, second):
+    """两个集合的Jaccard相似度"""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def minhash_signatures(shingle_sets, seed=0):
+    """计算每个n-gram集合的MinHash签名，返回形状为(行数, MINHASH_PERMUTATIONS)的数组"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, HASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, HASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+    signatures = np.full((len(shingle_sets), MINHASH_PERMUTATIONS), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for row, shingles in enumerate(shingle_sets):
+        if not shingles:
+            continue
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        # 系数和哈希值都小于2^32，(a * h + b) 不会超出64位无符号整数范围
+        signatures[row] = ((np.outer(a, hashes) + b[:, None]) % HASH_PRIME).min(axis=1)
+    return signatures
+
+
+def candidate_pairs(shingle_sets):
+    """返回分块内需要比较的位置对；行数较多时用MinHash分段，只比较至少一段签名相同的行"""
+    count = len(shingle_sets)
+    if count <= EXACT_BLOCK_SIZE:
+        return combinations(range(count), 2)
+
+    signatures = minhash_signatures(shingle_sets)
+    rows_per_band = MINHASH_PERMUTATIONS // LSH_BANDS
+    pairs = set()
+    for band in range(LSH_BANDS):
+        buckets = {}
+        band_signatures = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for position, band_signature in enumerate(map(bytes, band_signatures)):
+            buckets.setdefault(band_signature, []).append(position)
+        for positions in buckets.values():
+            if len(positions) > 1:
+                pairs.update(combinations(positions, 2))
+    return sorted(pairs)
+
+
+def find_near_duplicates(merged_data, threshold=DEFAULT_THRESHOLD, exclude_rows=()):
+    """查找疑似重复的行对
+
+    同一天、同一施工单位的行分为一块，只在块内比较作业类型（内容）和施工地点的n-gram相似度。
+    exclude_rows中的行（如已标记的完全重复行）不参与检查。
+    返回按相似度从高到低排列的列表，每项为{'rows': (行1, 行2), 'score': 平均相似度, 各文本列: 相似度}。
+    """
+    if merged_data is None or len(merged_data) == 0:
+        return []
+
+    data = merged_data.drop(index=list(exclude_rows), errors="ignore")
+    dates = pd.to_datetime(data["工作开始时间"], errors="coerce").dt.normalize()
+    units = data[BLOCK_COLUMN].map(normalize_text)
+    valid = dates.notna() & (units != "")
+    data = data[valid]
+
+    labels = data.index.tolist()
+
+    # 每行各文本列的n-gram集合
+    field_ngrams = {column: [ngrams(normalize_text(value)) for value in data[column]] for column in TEXT_COLUMNS}
+
+    results = []
+    for _, positions in data.groupby([dates[valid], units[valid]], sort=False).indices.items():
+        if len(positions) < 2:
+            continue
+        shingle_sets = [
+            {f"{i}:{gram}" for i, column in enumerate(TEXT_COLUMNS) for gram in field_ngrams[column][pos]}
+            for pos in positions
+        ]
+        for first, second in candidate_pairs(shingle_sets):
+            pos_first, pos_second = positions[first], positions[second]
+            scores = {column: jaccard(field_ngrams[column][pos_first], field_ngrams[column][pos_second])
+                      for column in TEXT_COLUMNS}
+            score = sum(scores.values()) / len(scores)
+            if score >= threshold:
+                results.append({
+                    "rows": (labels[pos_first], labels[pos_second]),
+                    "score": round(score, 3),
+                    **{column: round(value, 3) for column, value in scores.items()},
+                })
+
+    results.sort(key=lambda item: item["score"], reverse=True)
+    return results
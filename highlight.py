@@ -0,0 +1,137 @@
+import numpy as np
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import PatternFill
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils import get_column_letter
+
+# 标记样式：样式编号 -> 填充颜色
+DUPLICATE = "duplicate"  # 重复行，浅红色
+CONFLICT = "conflict"    # 时间冲突行，浅橙色
+VIOLATION = "violation"  # 规范检查不合格，黄色
+ADDED = "added"          # 与上次相比新增的行，浅绿色
+CHANGED = "changed"      # 与上次相比修改的单元格，浅蓝色
+HIGHLIGHT_STYLES = {
+    DUPLICATE: "FFB6C1",
+    CONFLICT: "FFD39B",
+    VIOLATION: "FFFF00",
+    ADDED: "C6EFCE",
+    CHANGED: "BDD7EE",
+}
+
+# 应用方式
+BULK = "bulk"                # 直接设置单元格填充
+CONDITIONAL = "conditional"  # 按区域添加条件格式，适用于只写模式的工作表
+MAX_RANGES_PER_RULE = 500    # 每条条件格式规则包含的区域数上限
+
+_fills = {}
+
+
+def get_fill(style_id):
+    """每种样式只创建一个填充对象，所有单元格共用"""
+    if style_id not in _fills:
+        color = HIGHLIGHT_STYLES[style_id]
+        _fills[style_id] = PatternFill(start_color=color, end_color=color, fill_type='solid')
+    return _fills[style_id]
+
+
+class HighlightLayer:
+    """先按规则收集需要标记的单元格，最后按样式一次性应用
+
+    行列位置从0开始，相对于first_row、first_col；同一单元格被多条规则标记时，后添加的规则生效。
+    """
+
+    def __init__(self, first_row=1, first_col=1):
+        self.first_row = first_row
+        self.first_col = first_col
+        self.rules = []  # [(样式编号, 行位置数组, 列位置数组)]
+
+    def add_cells(self, style_id, rows, cols):
+        """标记若干单元格，rows和cols一一对应"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if len(rows):
+            self.rules.append((style_id, rows, cols))
+
+    def add_rows(self, style_id, rows, columns):
+        """标记若干行中的指定列"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        self.add_cells(style_id, np.repeat(rows, len(columns)), np.tile(columns, len(rows)))
+
+    def add_mask(self, style_id, mask):
+        """按二维布尔掩码（行 × 列）标记"""
+        rows, cols = np.nonzero(np.asarray(mask, dtype=bool))
+        self.add_cells(style_id, rows, cols)
+
+    def extend(self, other):
+        """追加另一组标记的规则，优先级高于已有规则"""
+        self.rules.extend(other.rules)
+
+    def resolve(self):
+        """合并所有规则，返回{样式编号: (行位置数组, 列位置数组)}，每个单元格只属于一种样式"""
+        if not self.rules:
+            return {}
+        style_ids = list(dict.fromkeys(style_id for style_id, _, _ in self.rules))
+        rows = np.concatenate([rule_rows for _, rule_rows, _ in self.rules])
+        cols = np.concatenate([rule_cols for _, _, rule_cols in self.rules])
+        codes = np.concatenate([np.full(len(rule_rows), style_ids.index(style_id), dtype=np.int32)
+                                for style_id, rule_rows, _ in self.rules])
+
+        # 倒序后取每个单元格第一次出现的位置，即最后添加的规则；结果按行、列排序
+        keys = (rows << 32) | cols
+        _, first = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - first
+        rows, cols, codes = rows[last], cols[last], codes[last]
+        return {style_id: (rows[codes == code], cols[codes == code]) for code, style_id in enumerate(style_ids)
+                if (codes == code).any()}
+
+    def apply(self, ws, mode=BULK):
+        """将收集的标记应用到工作表"""
+        for style_id, (rows, cols) in self.resolve().items():
+            if mode == BULK:
+                self.apply_bulk(ws, style_id, rows, cols)
+            elif mode == CONDITIONAL:
+                self.apply_conditional(ws, style_id, rows, cols)
+            else:
+                raise ValueError(f"不支持的标记方式：{mode}")
+
+    def apply_bulk(self, ws, style_id, rows, cols):
+        """填充样式只在工作簿中登记一次，之后直接写入各单元格的样式编号"""
+        fill_id = ws.parent._fills.add(get_fill(style_id))
+        for row, col in zip((rows + self.first_row).tolist(), (cols + self.first_col).tolist()):
+            cell = ws.cell(row=row, column=col)
+            if cell._style is None:
+                cell._style = StyleArray()
+            cell._style.fillId = fill_id
+
+    def apply_conditional(self, ws, style_id, rows, cols):
+        """将单元格合并为矩形区域，每种样式添加一条（或少数几条）始终成立的条件格式"""
+        ranges = [
+            f"{get_column_letter(col_start)}{row_start}:{get_column_letter(col_end)}{row_end}"
+            for row_start, row_end, col_start, col_end in self.to_ranges(rows, cols)
+        ]
+        for start in range(0, len(ranges), MAX_RANGES_PER_RULE):
+            ws.conditional_formatting.add(" ".join(ranges[start:start + MAX_RANGES_PER_RULE]),
+                                          FormulaRule(formula=["TRUE"], fill=get_fill(style_id)))
+
+    def to_ranges(self, rows, cols):
+        """将按行、列排序的单元格合并为矩形区域，返回[(起始行, 结束行, 起始列, 结束列)]（Excel行列号）"""
+        # 每行中连续的列合并为一段
+        segments = []
+        for row, col in zip((rows + self.first_row).tolist(), (cols + self.first_col).tolist()):
+            if segments and segments[-1][0] == row and segments[-1][2] == col - 1:
+                segments[-1][2] = col
+            else:
+                segments.append([row, col, col])
+
+        # 相邻行中列范围相同的段合并为一个区域
+        ranges = []
+        open_ranges = {}  # {(起始列, 结束列): 区域在ranges中的位置}
+        for row, col_start, col_end in segments:
+            position = open_ranges.get((col_start, col_end))
+            if position is not None and ranges[position][1] == row - 1:
+                ranges[position][1] = row
+            else:
+                open_ranges[(col_start, col_end)] = len(ranges)
+                ranges.append([row, row, col_start, col_end])
+        return [tuple(item) for item in ranges]
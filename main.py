@@ -3,50 +3,59 @@ import os
 from datetime import datetime
 from PySide6.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                            QWidget, QFileDialog, QMessageBox, QListWidget, QLabel,
-                           QHBoxLayout, QTableWidget, QTableWidgetItem, QProgressBar, QTextEdit)
-from PySide6.QtCore import Qt, QThread, Signal
+                           QHBoxLayout, QTableWidget, QTableWidgetItem, QProgressBar, QTextEdit,
+                           QComboBox, QCheckBox, QDialog, QHeaderView)
+from PySide6.QtCore import Qt, QThread, Signal, QTimer
 from PySide6.QtGui import QIcon, QColor
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Border, Side, PatternFill
-from excel_processor import ExcelProcessor
-from file_preview import FilePreviewWindow
+
+# pandas、openpyxl导入较慢，主窗口显示后由PrewarmWorker在后台加载，
+# excel_processor和file_preview同样延迟导入，以缩短启动时间
+
+class PrewarmWorker(QThread):
+    loaded = Signal()     # 加载完成信号
+    error = Signal(str)   # 错误信号
+
+    def run(self):
+        try:
+            import excel_processor  # noqa: F401
+            import file_preview  # noqa: F401
+            self.loaded.emit()
+        except Exception as e:
+            self.error.emit(str(e))
 
 class MergeWorker(QThread):
     progress_updated = Signal(int)  # 进度信号
     finished = Signal(bool, str)    # 完成信号
     error = Signal(str)             # 错误信号
 
-    def __init__(self, processor, files, template_file):
+    def __init__(self, processor, files, template_file, partition_by=None, provenance_mode=None, streaming=False,
+                 previous_file=None):
         super().__init__()
         self.processor = processor
         self.files = files
         self.template_file = template_file
+        self.partition_by = partition_by  # 为None时合并为一个文件
+        self.provenance_mode = provenance_mode  # 为None时不输出数据来源
+        self.streaming = streaming  # 大文件模式，逐行写入输出文件
+        self.previous_file = previous_file  # 上次的合并结果，为None时不比较
 
     def run(self):
         try:
             # 更新进度：开始处理
             self.progress_updated.emit(10)
 
-            # 合并文件
-            merged_data, message = self.processor.merge_files(self.files)
-            if merged_data is None:
-                self.error.emit(message)
-                return
-
-            # 更新进度：文件合并完成
-            self.progress_updated.emit(50)
-
             # 生成输出文件名
             desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
             current_date = datetime.now().strftime('%Y%m%d')
             
-            # 从第一个文件中获取A2/A3内容
+            # 从第一个文件中获取A2/A3内容（只读方式打开，不加载整个文件）
             try:
-                wb = load_workbook(self.files[0])
+                from openpyxl import load_workbook
+                wb = load_workbook(self.files[0], read_only=True)
                 ws = wb.active
                 a2_content = ws['A2'].value
                 a3_content = ws['A3'].value
+                wb.close()
                 content = a2_content if a2_content else a3_content
                 if content:
                     output_file = os.path.join(desktop_path, f'附录2：{content}.xlsx')
@@ -55,8 +64,42 @@ class MergeWorker(QThread):
             except Exception:
                 output_file = os.path.join(desktop_path, f'附录2：营销现场作业计划审批表_{current_date}.xlsx')
 
+            # 大文件模式：合并和保存一步完成
+            if self.streaming:
+                success, message = self.processor.merge_files_streaming(self.files, self.template_file, output_file)
+                self.progress_updated.emit(100)
+                self.finished.emit(success, message)
+                return
+
+            # 合并文件
+            merged_data, message = self.processor.merge_files(self.files)
+            if merged_data is None:
+                self.error.emit(message)
+                return
+
+            # 更新进度：文件合并完成
+            self.progress_updated.emit(50)
+
+            # 与上次的合并结果比较
+            diff_message = None
+            if self.previous_file:
+                _, diff_message = self.processor.compare_with_previous(self.previous_file)
+
             # 保存文件
-            success, message = self.processor.save_output(self.template_file, merged_data, output_file)
+            if self.partition_by:
+                # 拆分输出：保存到桌面上的同名文件夹中，每个分组一个文件
+                file_prefix = os.path.splitext(os.path.basename(output_file))[0]
+                output_dir = os.path.join(desktop_path, f'{file_prefix}_按{self.partition_by}拆分')
+                success, message = self.processor.save_partitioned_output(
+                    self.template_file, merged_data, output_dir, self.partition_by, file_prefix,
+                    provenance_mode=self.provenance_mode)
+            else:
+                success, message = self.processor.save_output(self.template_file, merged_data, output_file,
+                                                              self.provenance_mode, with_diff=True)
+
+            if success and diff_message:
+                first_line, *rest = message.splitlines()
+                message = "\n".join([f"{first_line}；{diff_message}"] + rest)
 
             # 更新进度：完成
             self.progress_updated.emit(100)
@@ -67,6 +110,73 @@ class MergeWorker(QThread):
         except Exception as e:
             self.error.emit(str(e))
 
+class DiagnosticsDialog(QDialog):
+    """以表格显示检查结果，可导出为Excel或JSON"""
+    MAX_DISPLAY_ROWS = 1000  # 超过时只显示前1000条，完整结果请导出
+    SEVERITY_COLORS = {"错误": QColor(255, 200, 200), "警告": QColor(255, 235, 180)}
+
+    def __init__(self, report, title, text, parent=None):
+        super().__init__(parent)
+        from diagnostics import REPORT_COLUMNS
+        self.report = report
+        self.setWindowTitle(title)
+        self.setMinimumSize(800, 450)
+        
+        layout = QVBoxLayout()
+        text_label = QLabel(text)
+        text_label.setWordWrap(True)
+        layout.addWidget(text_label)
+        
+        summary = report.summary()
+        if report.count() > self.MAX_DISPLAY_ROWS:
+            summary += f"（仅显示前 {self.MAX_DISPLAY_ROWS} 项，完整结果请导出）"
+        layout.addWidget(QLabel(summary))
+        
+        # 检查结果表格，错误和警告排在前面
+        fields = ["severity", "file", "sheet", "row", "column", "message", "code"]
+        order = {"错误": 0, "警告": 1}
+        issues = sorted(report.issues, key=lambda issue: order.get(issue.severity, 2))[:self.MAX_DISPLAY_ROWS]
+        table = QTableWidget(len(issues), len(fields))
+        table.setHorizontalHeaderLabels([REPORT_COLUMNS[field] for field in fields])
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        for row, issue in enumerate(issues):
+            for col, field in enumerate(fields):
+                value = getattr(issue, field)
+                if field == "file" and value:
+                    value = os.path.basename(value)
+                item = QTableWidgetItem("" if value is None else str(value))
+                if issue.severity in self.SEVERITY_COLORS:
+                    item.setBackground(self.SEVERITY_COLORS[issue.severity])
+                table.setItem(row, col, item)
+        table.horizontalHeader().setSectionResizeMode(fields.index("message"), QHeaderView.Stretch)
+        table.resizeColumnsToContents()
+        layout.addWidget(table)
+        
+        button_layout = QHBoxLayout()
+        export_button = QPushButton("导出检查结果")
+        export_button.clicked.connect(self.export_report)
+        button_layout.addWidget(export_button)
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+
+    def export_report(self):
+        """导出完整的检查结果"""
+        default_path = os.path.join(os.path.expanduser('~'), 'Desktop',
+                                    f"检查结果_{datetime.now().strftime('%Y%m%d')}.xlsx")
+        file, _ = QFileDialog.getSaveFileName(self, "导出检查结果", default_path,
+                                              "Excel Files (*.xlsx);;JSON Files (*.json)")
+        if not file:
+            return
+        try:
+            self.report.save(file)
+            QMessageBox.information(self, "成功", f"检查结果已导出到：\n{file}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出失败：{str(e)}")
+
 class ExcelMergerApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -87,7 +197,7 @@ class ExcelMergerApp(QMainWindow):
         self.selected_files = []
         self.template_file = None
         self.preview_window = None
-        self.processor = ExcelProcessor()
+        self.processor = None  # 后台加载完成后创建
         
         # 检查默认模板是否存在
         if os.path.exists(self.default_template):
@@ -95,6 +205,37 @@ class ExcelMergerApp(QMainWindow):
         
         self.init_ui()
         self.center_window()
+        
+        # 窗口显示后再开始后台加载，加载完成前不能合并
+        self.merge_button.setEnabled(False)
+        self.output_mode_combo.setEnabled(False)
+        self.status_label.setText("正在加载组件...")
+        QTimer.singleShot(0, self.start_prewarm)
+
+    def start_prewarm(self):
+        """在后台线程中预加载数据处理模块"""
+        self.prewarm_worker = PrewarmWorker()
+        self.prewarm_worker.loaded.connect(self.handle_prewarm_finished)
+        self.prewarm_worker.error.connect(self.handle_prewarm_error)
+        self.prewarm_worker.start()
+
+    def handle_prewarm_finished(self):
+        """组件加载完成，创建处理器并启用合并功能"""
+        from excel_processor import ExcelProcessor
+        self.processor = ExcelProcessor()
+        
+        for option in ExcelProcessor.PARTITION_OPTIONS:
+            self.output_mode_combo.addItem(f"按{option}拆分为多个文件", option)
+        
+        self.merge_button.setEnabled(True)
+        self.update_output_options()
+        if self.status_label.text() == "正在加载组件...":
+            self.status_label.setText("")
+
+    def handle_prewarm_error(self, error_message):
+        """组件加载失败"""
+        QMessageBox.critical(self, "错误", f"加载组件失败：\n{error_message}")
+        self.status_label.setText("加载组件失败，无法合并文件")
 
     def center_window(self):
         """将窗口居中显示"""
@@ -146,6 +287,29 @@ class ExcelMergerApp(QMainWindow):
         self.template_label = QLabel("未选择模板文件" if not self.template_file else f"已选择模板：\n{os.path.basename(self.template_file)}")
         layout.addWidget(self.template_label)
         
+        # 创建输出方式选择框
+        output_layout = QHBoxLayout()
+        output_layout.addWidget(QLabel("输出方式："))
+        self.output_mode_combo = QComboBox()
+        self.output_mode_combo.addItem("合并为一个文件", None)  # 拆分选项在组件加载完成后添加
+        output_layout.addWidget(self.output_mode_combo)
+        
+        # 创建数据来源选项
+        self.provenance_checkbox = QCheckBox("附加数据来源工作表")
+        output_layout.addWidget(self.provenance_checkbox)
+        
+        # 创建大文件模式选项（不支持拆分输出和数据来源）
+        self.streaming_checkbox = QCheckBox("大文件模式（低内存）")
+        self.streaming_checkbox.toggled.connect(self.update_output_options)
+        output_layout.addWidget(self.streaming_checkbox)
+        layout.addLayout(output_layout)
+        
+        # 创建与上次结果比较选项（选择上次输出的审批表）
+        self.previous_file = None
+        self.compare_checkbox = QCheckBox("与上次结果比较")
+        self.compare_checkbox.toggled.connect(self.select_previous)
+        layout.addWidget(self.compare_checkbox)
+        
         # 创建合并按钮
         self.merge_button = QPushButton("合并文件")
         self.merge_button.clicked.connect(self.merge_files)
@@ -162,6 +326,36 @@ class ExcelMergerApp(QMainWindow):
         
         main_widget.setLayout(layout)
 
+    def update_output_options(self):
+        """大文件模式下只能合并为一个文件，且不输出数据来源"""
+        streaming = self.streaming_checkbox.isChecked()
+        if streaming:
+            self.output_mode_combo.setCurrentIndex(0)
+            self.provenance_checkbox.setChecked(False)
+            self.compare_checkbox.setChecked(False)
+        self.output_mode_combo.setEnabled(not streaming and self.processor is not None)
+        self.provenance_checkbox.setEnabled(not streaming)
+        self.compare_checkbox.setEnabled(not streaming)
+
+    def select_previous(self, checked):
+        """勾选比较时选择上次输出的审批表，取消选择时不比较"""
+        if not checked:
+            self.previous_file = None
+            self.compare_checkbox.setText("与上次结果比较")
+            return
+        
+        file, _ = QFileDialog.getOpenFileName(
+            self,
+            "选择上次的合并结果",
+            os.path.join(os.path.expanduser('~'), 'Desktop'),
+            "Excel Files (*.xlsx)"
+        )
+        if not file:
+            self.compare_checkbox.setChecked(False)
+            return
+        self.previous_file = file
+        self.compare_checkbox.setText(f"与上次结果比较：{os.path.basename(file)}")
+
     def clear_selection(self):
         """清除已选择的文件"""
         self.selected_files = []
@@ -221,7 +415,10 @@ class ExcelMergerApp(QMainWindow):
         self.progress_bar.setValue(0)
         
         # 创建处理线程
-        self.worker = MergeWorker(self.processor, self.selected_files, self.template_file)
+        provenance_mode = self.processor.PROVENANCE_SHEET if self.provenance_checkbox.isChecked() else None
+        self.worker = MergeWorker(self.processor, self.selected_files, self.template_file,
+                                  self.output_mode_combo.currentData(), provenance_mode,
+                                  self.streaming_checkbox.isChecked(), self.previous_file)
         
         # 连接信号
         self.worker.progress_updated.connect(self.progress_bar.setValue)
@@ -235,25 +432,23 @@ class ExcelMergerApp(QMainWindow):
         self.merge_button.setEnabled(False)
         self.select_button.setEnabled(False)
         self.template_button.setEnabled(False)
-        
-    def handle_merge_error(self, error_message):
-        """处理合并错误"""
-        self.progress_bar.setVisible(False)
+        self.output_mode_combo.setEnabled(False)
+        self.provenance_checkbox.setEnabled(False)
+        self.streaming_checkbox.setEnabled(False)
+        self.compare_checkbox.setEnabled(False)
+        
+    def show_error(self, text, message):
+        """显示错误信息，有检查结果时以表格显示"""
+        if self.processor.report.count():
+            DiagnosticsDialog(self.processor.report, "错误", f"{text}\n{message.splitlines()[0]}", self).exec()
+            return
         
         # 创建详细的错误信息对话框
         error_dialog = QMessageBox(self)
         error_dialog.setIcon(QMessageBox.Critical)
         error_dialog.setWindowTitle("错误")
-        error_dialog.setText("合并过程中出现错误")
-        
-        # 分析错误信息
-        if "详细错误信息：" in error_message:
-            main_error, detailed_error = error_message.split("详细错误信息：", 1)
-            error_dialog.setInformativeText(main_error.strip())
-            error_dialog.setDetailedText(detailed_error.strip())
-        else:
-            error_dialog.setDetailedText(error_message)
-        
+        error_dialog.setText(text)
+        error_dialog.setDetailedText(message)
         error_dialog.setStandardButtons(QMessageBox.Ok)
         
         # 调整对话框大小
@@ -262,11 +457,19 @@ class ExcelMergerApp(QMainWindow):
             text_browser.setMinimumSize(600, 400)
         
         error_dialog.exec_()
+
+    def handle_merge_error(self, error_message):
+        """处理合并错误"""
+        self.progress_bar.setVisible(False)
+        
+        self.show_error("合并过程中出现错误", error_message)
         
         # 重新启用按钮
         self.merge_button.setEnabled(True)
         self.select_button.setEnabled(True)
         self.template_button.setEnabled(True)
+        self.streaming_checkbox.setEnabled(True)
+        self.update_output_options()
         
         # 更新状态
         self.status_label.setText("合并失败，请查看错误信息")
@@ -276,58 +479,29 @@ class ExcelMergerApp(QMainWindow):
         self.progress_bar.setVisible(False)
         
         if success:
-            # 检查是否有警告信息
-            if "但存在以下问题：" in message:
-                warning_dialog = QMessageBox(self)
-                warning_dialog.setIcon(QMessageBox.Warning)
-                warning_dialog.setWindowTitle("部分成功")
-                warning_dialog.setText("文件已合并，但存在一些问题")
-                warning_dialog.setDetailedText(message)
-                warning_dialog.setStandardButtons(QMessageBox.Ok)
-                
-                # 调整对话框大小
-                text_browser = warning_dialog.findChild(QTextEdit)
-                if text_browser is not None:
-                    text_browser.setMinimumSize(600, 400)
-                
-                warning_dialog.exec_()
+            # 检查结果中有错误或警告时以表格显示
+            if self.processor.report.has_warnings():
+                DiagnosticsDialog(self.processor.report, "部分成功",
+                                  f"文件已合并，但存在一些问题\n{message.splitlines()[0]}", self).exec()
                 self.status_label.setText("合并完成，但有部分问题")
             else:
                 QMessageBox.information(self, "成功", message)
                 self.status_label.setText("合并完成！")
         else:
-            # 创建详细的错误信息对话框
-            error_dialog = QMessageBox(self)
-            error_dialog.setIcon(QMessageBox.Critical)
-            error_dialog.setWindowTitle("错误")
-            error_dialog.setText("合并失败")
-            
-            # 分析错误信息
-            if "详细错误信息：" in message:
-                main_error, detailed_error = message.split("详细错误信息：", 1)
-                error_dialog.setInformativeText(main_error.strip())
-                error_dialog.setDetailedText(detailed_error.strip())
-            else:
-                error_dialog.setDetailedText(message)
-            
-            error_dialog.setStandardButtons(QMessageBox.Ok)
-            
-            # 调整对话框大小
-            text_browser = error_dialog.findChild(QTextEdit)
-            if text_browser is not None:
-                text_browser.setMinimumSize(600, 400)
-            
-            error_dialog.exec_()
+            self.show_error("合并失败", message)
             self.status_label.setText("合并失败，请查看错误信息")
         
         # 重新启用按钮
         self.merge_button.setEnabled(True)
         self.select_button.setEnabled(True)
         self.template_button.setEnabled(True)
+        self.streaming_checkbox.setEnabled(True)
+        self.update_output_options()
 
     def preview_file(self):
         """打开文件预览窗口"""
         if not self.preview_window:
+            from file_preview import FilePreviewWindow
             self.preview_window = FilePreviewWindow()
         self.preview_window.show()
 
@@ -0,0 +1,145 @@
+import os
+import pandas as pd
+import snapshot
+
+# 序号每次重新编号，不参与比较
+SEQUENCE_COLUMN = "序号"
+DATE_COLUMNS = ["工作开始时间", "工作结束时间"]
+
+# 行的标识：同一供电所、同一施工单位、同一施工地点、同一天开始的作业视为同一项作业，
+# 其他列不同时记为修改；标识相同的多行按出现顺序依次对应
+KEY_COLUMNS = ["供电所", "施工单位", "施工地点", "工作开始时间"]
+
+ADDED = "新增"
+REMOVED = "删除"
+CHANGED = "修改"
+
+
+def compare_columns(columns):
+    """参与比较的列"""
+    return [column for column in columns if column != SEQUENCE_COLUMN]
+
+
+def load_previous(path, columns):
+    """读取上次的合并结果：快照目录或输出的审批表（.xlsx），columns为输出文件中各列的列名"""
+    if os.path.isdir(path):
+        merged_data, _, _, _ = snapshot.load_snapshot(path)
+        return merged_data
+    return read_output(path, columns)
+
+
+def read_output(path, columns):
+    """读取输出的审批表：在A列找到"序号"表头，其后A列为数字的行为数据行，前len(columns)列依次命名为columns"""
+    raw = pd.read_excel(path, header=None, dtype=str)
+    first_column = raw.iloc[:, 0].fillna("").str.strip()
+    header_rows = first_column.index[first_column == "序号"]
+    if len(header_rows) == 0:
+        raise ValueError(f"{os.path.basename(path)} 中没有找到'序号'表头")
+
+    data = raw.loc[header_rows[0] + 1:]
+    data = data[first_column.loc[data.index].str.fullmatch(r"\d+")]
+    data = data.iloc[:, :len(columns)].reset_index(drop=True)
+    data.columns = columns[:data.shape[1]]
+    return data.reindex(columns=columns)
+
+
+def normalize_frame(data, columns):
+    """将比较列统一为去掉首尾空白的文本，时间只保留日期（与输出文件一致）"""
+    frame = pd.DataFrame(index=data.index)
+    for column in compare_columns(columns):
+        if column not in data.columns:
+            frame[column] = ""
+            continue
+        values = data[column]
+        if column in DATE_COLUMNS:
+            dates = pd.to_datetime(values, errors="coerce")
+            text = dates.dt.strftime("%Y-%m-%d")
+            values = text.where(dates.notna(), values.astype(object))
+        text = values.astype(object).where(values.notna(), "").astype(str).str.strip()
+        # 整数值的小数（如"3.0"）与整数视为相同
+        frame[column] = text.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    return frame
+
+
+def _match(old_keys, new_keys):
+    """按键对应两组行，标识相同的多行按出现顺序依次对应，返回(旧行位置, 新行位置)数组"""
+    old = pd.DataFrame({"key": old_keys, "occurrence": old_keys.groupby(old_keys).cumcount(),
+                        "old": range(len(old_keys))})
+    new = pd.DataFrame({"key": new_keys, "occurrence": new_keys.groupby(new_keys).cumcount(),
+                        "new": range(len(new_keys))})
+    matched = old.merge(new, on=["key", "occurrence"])
+    return matched["old"].to_numpy(), matched["new"].to_numpy()
+
+
+def diff_merges(old_data, new_data, columns, key_columns=KEY_COLUMNS):
+    """比较两次合并结果的columns列，返回{'added', 'removed', 'changed', 'unchanged'}
+
+    added、removed为新增行（本次结果中的位置）和删除行（上次结果中的位置），
+    changed中每项为{'old': 上次位置, 'new': 本次位置, 'columns': [修改的列]}，unchanged为未变化的行数。
+    每行计算标识和内容的哈希值后用哈希连接对应，耗时与行数成正比。
+    """
+    old_frame = normalize_frame(old_data.reset_index(drop=True), columns)
+    new_frame = normalize_frame(new_data.reset_index(drop=True), columns)
+
+    old_hash = pd.util.hash_pandas_object(old_frame, index=False)
+    new_hash = pd.util.hash_pandas_object(new_frame, index=False)
+    old_key = pd.util.hash_pandas_object(old_frame[key_columns], index=False)
+    new_key = pd.util.hash_pandas_object(new_frame[key_columns], index=False)
+
+    # 先对应内容完全相同的行
+    old_same, new_same = _match(old_hash, new_hash)
+    old_rest = old_key.drop(index=old_same)
+    new_rest = new_key.drop(index=new_same)
+
+    # 其余的行按标识对应，对应上的为修改，对应不上的为新增或删除
+    old_pos, new_pos = _match(old_rest.reset_index(drop=True), new_rest.reset_index(drop=True))
+    old_changed = old_rest.index.to_numpy()[old_pos]
+    new_changed = new_rest.index.to_numpy()[new_pos]
+
+    changed = []
+    if len(old_changed):
+        differs = old_frame.iloc[old_changed].to_numpy() != new_frame.iloc[new_changed].to_numpy()
+        for old_row, new_row, row_differs in zip(old_changed.tolist(), new_changed.tolist(), differs):
+            changed.append({
+                "old": old_row,
+                "new": new_row,
+                "columns": [column for column, differ in zip(old_frame.columns, row_differs) if differ],
+            })
+    changed.sort(key=lambda item: item["new"])
+
+    return {
+        "added": sorted(set(new_rest.index.tolist()) - set(new_changed.tolist())),
+        "removed": sorted(set(old_rest.index.tolist()) - set(old_changed.tolist())),
+        "changed": changed,
+        "unchanged": len(old_same),
+    }
+
+
+def summarize(diff):
+    """变更情况的简要说明"""
+    return (f"与上次合并结果相比：新增 {len(diff['added'])} 行，删除 {len(diff['removed'])} 行，"
+            f"修改 {len(diff['changed'])} 行，未变化 {diff['unchanged']} 行")
+
+
+def write_diff_sheet(wb, diff, old_data, new_data, columns, sheet_name="变更情况"):
+    """生成变更情况工作表：每行列出变更类型、本次和上次的序号、修改的列，以及修改前后的内容"""
+    old_frame = normalize_frame(old_data.reset_index(drop=True), columns)
+    new_frame = normalize_frame(new_data.reset_index(drop=True), columns)
+
+    ws = wb.create_sheet(sheet_name)
+    ws.append(["变更类型", "本次序号", "上次序号", "修改的列"] + list(new_frame.columns))
+    for item in diff["changed"]:
+        old_values = old_frame.iloc[item["old"]]
+        new_values = new_frame.iloc[item["new"]]
+        values = [f"{old_values[column]} → {new_values[column]}" if column in item["columns"] else new_values[column]
+                  for column in new_frame.columns]
+        ws.append([CHANGED, item["new"] + 1, item["old"] + 1, "、".join(item["columns"])] + values)
+    for row in diff["added"]:
+        ws.append([ADDED, row + 1, None, None] + new_frame.iloc[row].tolist())
+    for row in diff["removed"]:
+        ws.append([REMOVED, None, row + 1, None] + old_frame.iloc[row].tolist())
+
+    ws.freeze_panes = "A2"
+    for col_letter, width in zip("ABCD", [10, 10, 10, 24]):
+        ws.column_dimensions[col_letter].width = width
+    return ws
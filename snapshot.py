@@ -0,0 +1,96 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# 快照目录结构：
+#   meta.json           列信息、分类取值、重复行等元数据
+#   columns/<序号>.npy  每列一个文件，按列存储，读取时以内存映射方式打开
+#   provenance/<序号>.npy 数据来源列
+SNAPSHOT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def _encode_column(series):
+    """将一列转换为可直接内存映射的数组，返回(数组, 列信息)"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy("datetime64[ns]").view("int64")
+        return values, {"kind": "datetime"}
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categorical = series.array
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(), {"kind": "numeric"}
+    else:
+        # 文本列按字典编码存储：整数编码 + 取值列表
+        categorical = pd.Categorical(series.where(series.isna(), series.astype(str)))
+    categories = [str(value) for value in categorical.categories]
+    return np.asarray(categorical.codes), {"kind": "category", "categories": categories}
+
+
+def _decode_column(values, info):
+    """根据列信息将内存映射的数组还原为列，不复制数据"""
+    if info["kind"] == "datetime":
+        return pd.Series(values.view("datetime64[ns]"), copy=False)
+    if info["kind"] == "category":
+        return pd.Series(pd.Categorical.from_codes(values, categories=info["categories"], validate=False),
+                         copy=False)
+    return pd.Series(values, copy=False)
+
+
+def _write_frame(frame, directory):
+    """按列写入数据框，返回各列信息"""
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for position, name in enumerate(frame.columns):
+        values, info = _encode_column(frame[name])
+        np.save(os.path.join(directory, f"{position}.npy"), values)
+        columns.append({"name": str(name), **info})
+    return columns
+
+
+def _read_frame(directory, columns, mmap_mode):
+    """按列读取数据框"""
+    data = {}
+    for position, info in enumerate(columns):
+        values = np.load(os.path.join(directory, f"{position}.npy"), mmap_mode=mmap_mode)
+        data[info["name"]] = _decode_column(values, info)
+    return pd.DataFrame(data, copy=False)
+
+
+def save_snapshot(snapshot_path, merged_data, duplicate_rows, provenance=None, extra=None):
+    """将合并结果保存为按列存储的快照目录，extra为需要一并保存的其他信息（需可转为JSON）"""
+    # 先删除旧的元数据，写入过程中旧快照不可读取
+    meta_path = os.path.join(snapshot_path, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    frame = merged_data.reset_index(drop=True)
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "rows": len(frame),
+        "columns": _write_frame(frame, os.path.join(snapshot_path, "columns")),
+        "duplicate_rows": [int(row) for row in duplicate_rows],
+        "provenance": None,
+        "extra": extra or {},
+    }
+    if provenance is not None:
+        meta["provenance"] = _write_frame(provenance.reset_index(drop=True),
+                                          os.path.join(snapshot_path, "provenance"))
+
+    # 元数据最后写入，只有完整写完的快照才能被读取
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def load_snapshot(snapshot_path, mmap_mode="r"):
+    """读取快照，数据以内存映射方式打开，返回(合并数据, 重复行, 数据来源, 其他信息)"""
+    with open(os.path.join(snapshot_path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本：{meta.get('version')}")
+
+    merged_data = _read_frame(os.path.join(snapshot_path, "columns"), meta["columns"], mmap_mode)
+    provenance = None
+    if meta["provenance"] is not None:
+        provenance = _read_frame(os.path.join(snapshot_path, "provenance"), meta["provenance"], mmap_mode)
+    return merged_data, meta["duplicate_rows"], provenance, meta["extra"]
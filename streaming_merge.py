@@ -0,0 +1,341 @@
+import heapq
+import os
+import pickle
+import tempfile
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, Alignment
+from template_cache import get_compiled_template
+from highlight import HighlightLayer, DUPLICATE, CONDITIONAL
+from diagnostics import Issue, ERROR, WARNING, MESSAGE_LIMIT
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+SAMPLE_ROWS = 1000  # 用于估算每行内存占用的行数
+MAX_FAN_IN = 16  # 每次最多同时归并的顺串数，超过时分多轮归并
+MIN_RUN_ROWS = 1000
+MAX_DATE_ISSUES = 100  # 每个文件逐个记录的无法识别时间的条数，其余合并为一条
+
+
+class StreamingMerger:
+    """超大文件的外存合并：分块读取并排序后写入临时文件，再按工作开始时间多路归并，逐行写入输出文件
+
+    内存占用由memory_budget_mb控制，与输入文件总大小无关，以下几项例外：
+    重复行的位置和标记重复行的条件格式区域随重复行数增长（每个重复行约几十字节）；
+    工作开始时间为空的行归并后共用同一排序键，判断重复时需记住所有这些行；
+    无法识别的时间每个文件只逐个记录前MAX_DATE_ISSUES条，其余合并为一条，不随行数增长。
+    为控制内存，该模式只标记完全重复行，不做时间冲突和疑似重复检查，也不记录数据来源。
+    """
+
+    def __init__(self, processor, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, temp_dir=None):
+        self.processor = processor
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.temp_dir = temp_dir
+        self.run_rows = None  # 每个顺串的行数，读取第一批数据后根据内存预算确定
+        self.start_index = None  # 工作开始时间在行中的位置
+
+    def merge(self, file_paths, template_path, output_path):
+        """合并文件并直接写入输出模板，返回(是否成功, 信息)，发现的问题记录在processor.report中"""
+        report = self.processor.report
+        sources = []
+        for file_path in file_paths:
+            source = self.find_source(file_path)
+            if source is not None:
+                sources.append(source)
+
+        if not sources:
+            error_message = "合并失败，没有有效数据可合并。\n\n详细错误信息：\n"
+            error_message += report.to_text(limit=MESSAGE_LIMIT)
+            return False, error_message
+
+        # 各文件列的并集，顺序与pd.concat一致
+        columns = []
+        for source in sources:
+            columns.extend(column for column in source['columns'] if column not in columns)
+        self.start_index = columns.index('工作开始时间')
+
+        try:
+            with tempfile.TemporaryDirectory(dir=self.temp_dir) as temp_dir:
+                runs = []
+                for source in sources:
+                    runs.extend(self.spill_runs(source, columns, temp_dir, len(runs)))
+
+                if not runs:
+                    error_message = "合并失败，没有有效数据可合并。\n\n详细错误信息：\n"
+                    error_message += report.to_text(limit=MESSAGE_LIMIT)
+                    return False, error_message
+
+                # 顺串过多时先分批归并，保证最后一轮同时打开的顺串不超过MAX_FAN_IN个
+                while len(runs) > MAX_FAN_IN:
+                    merged_runs = []
+                    for start in range(0, len(runs), MAX_FAN_IN):
+                        run_path = os.path.join(temp_dir, f"merge_{len(runs)}_{start}.pkl")
+                        self.write_run(run_path, (row for _, row in self.merge_runs(runs[start:start + MAX_FAN_IN])))
+                        merged_runs.append(run_path)
+                    runs = merged_runs
+
+                self.processor.a3_content = self.read_title(sources[0]['path'])
+                total_rows, duplicate_count = self.write_output(self.merge_runs(runs), template_path, output_path)
+        except Exception as e:
+            report.add("SAVE_FAILED", ERROR, f"保存失败：{str(e)}", output_path)
+            return False, f"保存失败：{str(e)}"
+
+        message = f"保存成功，共合并 {total_rows} 行，其中重复 {duplicate_count} 行"
+        if report.has_warnings():
+            message += "\n\n但存在以下问题：\n" + report.to_text(limit=MESSAGE_LIMIT)
+        return True, message
+
+    def find_source(self, file_path):
+        """查找文件中第一个表头有效的表格，返回{'path', 'sheet', 'header_row', 'columns'}，没有时记录问题并返回None"""
+        report = self.processor.report
+        if not os.path.exists(file_path):
+            report.add("FILE_NOT_FOUND", ERROR, "文件不存在", file_path)
+            return None
+
+        try:
+            wb = load_workbook(file_path, read_only=True, data_only=True)
+        except Exception as e:
+            report.add("FILE_UNREADABLE", ERROR, f"无法打开文件：{str(e)}", file_path)
+            return None
+
+        try:
+            issues = []
+            for sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+                top_rows = list(ws.iter_rows(min_row=1, max_row=5, values_only=True))
+                # 表头在第4行或第5行
+                for header_row in [3, 4]:
+                    if header_row >= len(top_rows):
+                        issues.append(Issue("HEADER_INVALID", ERROR, "表格行数不足",
+                                            file_path, sheet_name, header_row + 1))
+                        continue
+                    columns = self.build_columns(top_rows[header_row])
+                    is_valid, message = self.processor.validate_headers_df(pd.DataFrame(columns=columns))
+                    if is_valid:
+                        return {'path': file_path, 'sheet': sheet_name, 'header_row': header_row,
+                                'columns': columns}
+                    issues.append(Issue("HEADER_INVALID", ERROR, message,
+                                        file_path, sheet_name, header_row + 1))
+
+            issues.append(Issue("NO_VALID_SHEET", ERROR, "没有找到有效的表格结构", file_path))
+            report.extend(issues)
+            return None
+        finally:
+            wb.close()
+
+    def build_columns(self, header_values):
+        """按pandas的规则生成列名：空表头为"Unnamed: 序号"，重名的列加".1"等后缀"""
+        columns = []
+        seen = {}
+        for position, value in enumerate(header_values):
+            name = f"Unnamed: {position}" if value is None else str(value)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+        # 去掉末尾的空表头列
+        while columns and columns[-1].startswith("Unnamed: "):
+            columns.pop()
+        return columns
+
+    def read_chunks(self, source):
+        """分块读取表头下方的数据行，每块为一个数据框（所有值作为字符串读取）"""
+        wb = load_workbook(source['path'], read_only=True, data_only=True)
+        try:
+            ws = wb[source['sheet']]
+            columns = source['columns']
+            width = len(columns)
+            first_row = source['header_row'] + 2  # 表头下一行的Excel行号
+            chunk = []
+            chunk_size = SAMPLE_ROWS
+            # 数据框的索引为Excel行号
+            for values in ws.iter_rows(min_row=first_row, max_col=width, values_only=True):
+                chunk.append([self.cell_text(value) for value in values] + [None] * (width - len(values)))
+                if len(chunk) >= chunk_size:
+                    yield pd.DataFrame(chunk, columns=columns, index=range(first_row, first_row + len(chunk)))
+                    first_row += len(chunk)
+                    chunk = []
+                    chunk_size = self.run_rows or SAMPLE_ROWS
+            if chunk:
+                yield pd.DataFrame(chunk, columns=columns, index=range(first_row, first_row + len(chunk)))
+        finally:
+            wb.close()
+
+    def cell_text(self, value):
+        """与pd.read_excel(dtype=str)一致：空单元格为None，整数值的小数不带小数点"""
+        if value is None or value == '':
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def clean_chunk(self, df, source, max_issues=None):
+        """与process_file相同的清理规则：删除空行、转换时间格式，返回(数据框, 无法识别的时间数量)
+
+        max_issues为本块最多逐个记录的无法识别时间的条数。
+        """
+        df = df.loc[~((df.iloc[:, 1:].isna().all(axis=1)) & (df.iloc[:, 0].notna()))]
+        df = df.dropna(how='all').copy()
+        failures = self.processor.normalize_dates(df, source['path'], source['sheet'], 0, max_issues)
+        return df, failures
+
+    def spill_runs(self, source, columns, temp_dir, run_offset):
+        """读取一个文件，每块排序后写成一个顺串文件，返回顺串文件列表"""
+        report = self.processor.report
+        runs = []
+        total_rows = 0
+        failures = 0
+        has_start, has_end = False, False
+        buffer = []
+        buffer_rows = 0
+
+        def flush():
+            chunk = pd.concat(buffer, ignore_index=True).reindex(columns=columns)
+            chunk = chunk.sort_values('工作开始时间', kind='mergesort')
+            run_path = os.path.join(temp_dir, f"run_{run_offset + len(runs)}.pkl")
+            self.write_run(run_path, chunk.itertuples(index=False, name=None))
+            runs.append(run_path)
+
+        for df in self.read_chunks(source):
+            df, chunk_failures = self.clean_chunk(df, source, max(MAX_DATE_ISSUES - failures, 0))
+            failures += chunk_failures
+            if len(df) == 0:
+                continue
+            has_start = has_start or df['工作开始时间'].notna().any()
+            has_end = has_end or df['工作结束时间'].notna().any()
+            if self.run_rows is None:
+                self.run_rows = self.estimate_run_rows(df)
+            buffer.append(df)
+            buffer_rows += len(df)
+            total_rows += len(df)
+            if buffer_rows >= self.run_rows:
+                flush()
+                buffer, buffer_rows = [], 0
+        if buffer:
+            flush()
+
+        if failures > MAX_DATE_ISSUES:
+            report.add("DATE_UNPARSED", WARNING,
+                       f"另有 {failures - MAX_DATE_ISSUES} 个无法识别的时间未逐个列出，已按空值处理",
+                       source['path'], source['sheet'])
+        if total_rows == 0:
+            report.add("NO_DATA", ERROR, "没有有效数据", source['path'])
+            return []
+        if not has_start or not has_end:
+            report.add("TIME_COLUMN_EMPTY", ERROR, "时间列全为空", source['path'])
+            return []
+        return runs
+
+    def estimate_run_rows(self, df):
+        """根据样本每行的内存占用和内存预算确定每个顺串的行数"""
+        row_bytes = max(1, df.memory_usage(deep=True).sum() / len(df))
+        # 读取、排序时约有三份数据同时在内存中
+        return max(MIN_RUN_ROWS, int(self.memory_budget / (row_bytes * 3)))
+
+    def write_run(self, run_path, rows):
+        """将已排序的行分块写入顺串文件，读取时每次只加载一块"""
+        block_rows = max(1, (self.run_rows or MIN_RUN_ROWS) // MAX_FAN_IN)
+        with open(run_path, 'wb') as f:
+            block = []
+            for row in rows:
+                block.append(row)
+                if len(block) >= block_rows:
+                    pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    block = []
+            if block:
+                pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read_run(self, run_path):
+        """逐块读取顺串文件，逐行返回(排序键, 行)"""
+        start_index = self.start_index
+        with open(run_path, 'rb') as f:
+            while True:
+                try:
+                    block = pickle.load(f)
+                except EOFError:
+                    return
+                for row in block:
+                    yield self.sort_key(row[start_index]), row
+
+    def sort_key(self, start_time):
+        """排序键：时间为空的行排在最后，与sort_values一致"""
+        if pd.isna(start_time):
+            return (1, 0)
+        return (0, start_time.value)
+
+    def merge_runs(self, runs):
+        """多路归并多个顺串，相同时间的行保持文件顺序"""
+        return heapq.merge(*(self.read_run(run_path) for run_path in runs), key=lambda item: item[0])
+
+    def read_title(self, file_path):
+        """读取第一个文件的A2/A3内容作为标题"""
+        try:
+            wb = load_workbook(file_path, read_only=True)
+            try:
+                ws = wb.active
+                return ws['A2'].value or ws['A3'].value
+            finally:
+                wb.close()
+        except Exception:
+            return None
+
+    def write_output(self, merged_rows, template_path, output_path):
+        """将归并后的行逐行写入模板，返回(总行数, 重复行数)
+
+        每行写出后即释放；仍随行数增长的有重复行位置列表、标记重复行的条件格式区域，
+        以及工作开始时间为空的行（共用同一排序键，需全部记住以判断重复）。
+        """
+        template = get_compiled_template(template_path)
+        if template.unsupported:
+            self.processor.report.add("TEMPLATE_PARTIAL", WARNING,
+                                      f"大文件模式下不保留模板中的{'、'.join(template.unsupported)}", template_path)
+        overrides = {'A3': self.processor.a3_content} if self.processor.a3_content else None
+        wb, ws = template.stamp_write_only(overrides)
+
+        # 样式对象全部共用
+        font = Font(name='宋体', size=9)
+        alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                        top=Side(style='thin'), bottom=Side(style='thin'))
+
+        total_rows = 0
+        duplicate_rows = []
+        # 完全相同的行工作开始时间也相同，归并后必然相邻，只需记住当前时间的行
+        current_key, seen_rows = None, set()
+        for key, row in merged_rows:
+            row = tuple(None if pd.isna(value) else value for value in row)
+            if key != current_key:
+                current_key, seen_rows = key, set()
+            is_duplicate = row in seen_rows
+            seen_rows.add(row)
+
+            total_rows += 1
+            cells = []
+            for col_idx, value in enumerate(row, start=1):
+                if col_idx == 1:  # 序号列
+                    value = total_rows
+                elif col_idx in [7, 8]:  # 工作开始时间和工作结束时间列
+                    value = value.strftime("%Y-%m-%d") if value is not None else None
+                cell = WriteOnlyCell(ws, value=value)
+                cell.font = font
+                cell.alignment = alignment
+                cell.border = border
+                cells.append(cell)
+
+            row_idx = template.data_start_row + total_rows - 1
+            ws.row_dimensions[row_idx].height = self.processor.calculate_row_height(row, template.column_widths)
+            ws.append(cells)
+            # 只写模式下该行已写出，行高设置不再需要，释放以免随行数增长
+            ws.row_dimensions.pop(row_idx, None)
+            if is_duplicate:
+                duplicate_rows.append(total_rows - 1)
+
+        # 只写模式的单元格写出后不能再修改，重复行以条件格式标记
+        highlights = HighlightLayer(first_row=template.data_start_row)
+        highlights.add_rows(DUPLICATE, duplicate_rows, range(len(self.processor.REQUIRED_COLUMNS)))
+        highlights.apply(ws, CONDITIONAL)
+
+        wb.save(output_path)
+        return total_rows, len(duplicate_rows)
@@ -0,0 +1,233 @@
+from copy import copy, deepcopy
+from io import BytesIO
+import os
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle
+from openpyxl.styles.named_styles import NamedStyleList
+from openpyxl.utils import coordinate_to_tuple
+from openpyxl.utils.indexed_list import IndexedList
+
+# 模板缓存：{绝对路径: (修改时间, CompiledTemplate)}
+_template_cache = {}
+
+
+class CompiledTemplate:
+    """预先解析的输出模板：缓存文件内容和数据起始行、列宽等信息，不必每次从磁盘读取和查找
+
+    普通保存时从内存中的文件内容重新加载，模板的全部内容（默认字体、样式、主题等）都会保留；
+    只写模式无法加载已有文件，按预先解析的表头单元格、工作表设置和工作簿级别的样式重新生成。
+    """
+
+    DEFAULT_DATA_START_ROW = 7
+
+    def __init__(self, template_path):
+        with open(template_path, 'rb') as f:
+            data = f.read()
+        wb = load_workbook(BytesIO(data))
+        ws = wb.active
+
+        self.title = ws.title
+
+        # 表头及预设格式的单元格：(行, 列, 值, 字体, 边框, 填充, 对齐, 数字格式, 保护)
+        self.cells = []
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.value is None and not cell.has_style:
+                    continue
+                self.cells.append((
+                    cell.row, cell.column, cell.value,
+                    copy(cell.font), copy(cell.border), copy(cell.fill),
+                    copy(cell.alignment), cell.number_format, copy(cell.protection)
+                ))
+
+        # 合并区域
+        self.merged_ranges = [str(merged_range) for merged_range in ws.merged_cells.ranges]
+
+        # 列宽和行高
+        self.column_dimensions = {
+            col_letter: (dimension.width, dimension.customWidth, dimension.hidden, dimension.outlineLevel,
+                         dimension.min, dimension.max)
+            for col_letter, dimension in ws.column_dimensions.items()
+        }
+        self.column_widths = {}
+        for column in ws.iter_cols(max_row=1):
+            col_letter = column[0].column_letter
+            self.column_widths[col_letter] = ws.column_dimensions[col_letter].width
+        self.row_dimensions = {
+            idx: (dimension.height, dimension.hidden, dimension.outlineLevel)
+            for idx, dimension in ws.row_dimensions.items()
+        }
+
+        # 打印及页面设置
+        self.page_setup = copy(ws.page_setup)
+        self.print_options = copy(ws.print_options)
+        self.page_margins = copy(ws.page_margins)
+        self.header_footer = copy(ws.HeaderFooter)
+        self.sheet_format = copy(ws.sheet_format)
+        self.page_setup_pr = copy(ws.sheet_properties.pageSetUpPr)
+        self.print_title_rows = ws.print_title_rows
+        self.print_area = ws.print_area
+        self.freeze_panes = ws.freeze_panes
+
+        # 筛选、条件格式、数据验证和视图设置（缩放、网格线等）
+        self.auto_filter = deepcopy(ws.auto_filter)
+        self.conditional_formats = [
+            (str(conditional_format.sqref), [deepcopy(rule) for rule in conditional_format.rules])
+            for conditional_format in ws.conditional_formatting
+        ]
+        self.data_validations = [deepcopy(validation) for validation in ws.data_validations.dataValidation]
+        self.sheet_view = deepcopy(ws.sheet_view)
+
+        # 工作簿级别的内容：默认字体（列宽以其字符宽度计）、单元格样式、主题和文档属性
+        self.default_font = copy(wb._fonts[0])
+        self.named_styles = [
+            dict(name=style.name, font=copy(style.font), fill=copy(style.fill), border=copy(style.border),
+                 alignment=copy(style.alignment), number_format=style.number_format,
+                 protection=copy(style.protection), builtinId=style.builtinId, hidden=style.hidden)
+            for style in wb._named_styles
+        ]
+        self.loaded_theme = wb.loaded_theme
+        self.properties = deepcopy(wb.properties)
+        self.custom_doc_props = deepcopy(wb.custom_doc_props)
+
+        # 只写模式下无法复制的内容
+        self.unsupported = self.find_unsupported(wb, ws)
+        self.template_bytes = data
+
+        # 数据起始行：表头"序号"所在合并区域的下一行
+        self.data_start_row = self.find_data_start_row(ws)
+
+    def find_data_start_row(self, ws):
+        """根据"序号"表头的位置确定数据起始行，找不到时使用第7行"""
+        for row in ws.iter_rows(min_col=1, max_col=1):
+            cell = row[0]
+            if isinstance(cell.value, str) and cell.value.strip() == "序号":
+                header_end_row = cell.row
+                for merged_range in ws.merged_cells.ranges:
+                    if cell.coordinate in merged_range:
+                        header_end_row = merged_range.max_row
+                        break
+                return header_end_row + 1
+        return self.DEFAULT_DATA_START_ROW
+
+    def find_unsupported(self, wb, ws):
+        """列出模板中只写模式无法复制的内容"""
+        unsupported = []
+        if len(wb.sheetnames) > 1:
+            unsupported.append("其他工作表")
+        if len(wb.defined_names) or len(ws.defined_names):
+            unsupported.append("名称")
+        if ws._images or ws._charts:
+            unsupported.append("图片或图表")
+        if ws.tables:
+            unsupported.append("表格")
+        if any(cell.comment is not None or cell.hyperlink is not None for row in ws.iter_rows() for cell in row):
+            unsupported.append("批注或超链接")
+        return unsupported
+
+    def stamp(self):
+        """从缓存的文件内容加载模板，返回(工作簿, 工作表)"""
+        wb = load_workbook(BytesIO(self.template_bytes))
+        return wb, wb.active
+
+    def stamp_write_only(self, overrides=None):
+        """生成只写模式的工作簿并写入表头行，之后只能从数据起始行开始逐行追加
+
+        overrides为需要替换的表头单元格值，如{'A3': 标题}。返回(工作簿, 工作表)。
+        只写模式无法加载整个模板，unsupported中列出的内容不会保留。
+        """
+        wb = Workbook(write_only=True)
+        self.apply_workbook_settings(wb)
+        ws = wb.create_sheet(self.title)
+
+        # 只写模式下列宽、合并区域等设置需在写入单元格之前完成
+        for merged_range in self.merged_ranges:
+            ws.merged_cells.add(merged_range)
+        self.apply_sheet_settings(ws)
+
+        header_rows = {}
+        for row, column, value, font, border, fill, alignment, number_format, protection in self.cells:
+            if row >= self.data_start_row:
+                continue
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = font
+            cell.border = border
+            cell.fill = fill
+            cell.alignment = alignment
+            cell.number_format = number_format
+            cell.protection = protection
+            header_rows.setdefault(row, {})[column] = cell
+
+        for coordinate, value in (overrides or {}).items():
+            row, column = coordinate_to_tuple(coordinate)
+            cell = header_rows.setdefault(row, {}).get(column)
+            if cell is None:
+                cell = header_rows[row][column] = WriteOnlyCell(ws)
+            cell.value = value
+
+        for row in range(1, self.data_start_row):
+            cells = header_rows.get(row, {})
+            ws.append([cells.get(column) for column in range(1, max(cells, default=0) + 1)])
+
+        return wb, ws
+
+    def apply_workbook_settings(self, wb):
+        """应用模板的默认字体、单元格样式、主题和文档属性"""
+        wb._fonts = IndexedList()
+        wb._fonts.add(copy(self.default_font))
+        wb._named_styles = NamedStyleList()
+        for style in self.named_styles:
+            wb.add_named_style(NamedStyle(**{key: copy(value) for key, value in style.items()}))
+        wb.loaded_theme = self.loaded_theme
+        wb.properties = deepcopy(self.properties)
+        wb.custom_doc_props = deepcopy(self.custom_doc_props)
+
+    def apply_sheet_settings(self, ws):
+        """应用列宽、行高、打印设置、筛选、条件格式、数据验证和视图设置"""
+        for col_letter, (width, custom_width, hidden, outline_level, min_col, max_col) in self.column_dimensions.items():
+            dimension = ws.column_dimensions[col_letter]
+            if custom_width:
+                dimension.width = width
+            dimension.hidden = hidden
+            dimension.outlineLevel = outline_level
+            dimension.min = min_col
+            dimension.max = max_col
+        for idx, (height, hidden, outline_level) in self.row_dimensions.items():
+            dimension = ws.row_dimensions[idx]
+            dimension.height = height
+            dimension.hidden = hidden
+            dimension.outlineLevel = outline_level
+
+        ws.page_setup = copy(self.page_setup)
+        ws.print_options = copy(self.print_options)
+        ws.page_margins = copy(self.page_margins)
+        ws.HeaderFooter = copy(self.header_footer)
+        ws.sheet_format = copy(self.sheet_format)
+        ws.sheet_properties.pageSetUpPr = copy(self.page_setup_pr)
+        if self.print_title_rows:
+            ws.print_title_rows = self.print_title_rows
+        if self.print_area:
+            ws.print_area = self.print_area
+        ws.views.sheetView[0] = deepcopy(self.sheet_view)
+        ws.auto_filter = deepcopy(self.auto_filter)
+        ws.freeze_panes = self.freeze_panes
+
+        for sqref, rules in self.conditional_formats:
+            for rule in rules:
+                ws.conditional_formatting.add(sqref, deepcopy(rule))
+        for validation in self.data_validations:
+            ws.data_validations.append(deepcopy(validation))
+
+
+def get_compiled_template(template_path):
+    """获取预解析的模板，按路径和修改时间缓存，模板文件被修改后自动重新解析"""
+    path = os.path.abspath(template_path)
+    mtime = os.path.getmtime(path)
+    cached = _template_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    template = CompiledTemplate(path)
+    _template_cache[path] = (mtime, template)
+    return template